@@ -1,26 +1,34 @@
 from typing import Optional, List
 
 from .index import Index
-from .model import Model, Key, KeyList
+from .model import Model, Key, KeyList, ModelCache
 from .serializer import Serializer
+from .session import session
 
 
 def load_key(key: Optional[Key]):
     return key.load() if key else None
 
 
-def load_keys(keys: List[Optional[Key]]):
+def load_keys(keys: List[Optional[Key]], prefetch: Optional[List[str]] = None):
     _keys = []
     idx = []
     res: List[Optional[Model]] = [None for _ in keys]
+    # With a cache, models are taken from the cache as in `Key.load`
+    use_prefetched = Model.get_cache() is None
 
     for i, k in enumerate(keys):
-        if k:
+        if k and use_prefetched and k.prefetched is not None:
+            res[i] = k.prefetched
+        elif k:
             _keys.append(k)
             idx.append(i)
 
+    if prefetch:
+        Model.prefetch(res, prefetch)
+
     key_list = KeyList(_keys)
-    values = key_list.load()
+    values = key_list.load(prefetch=prefetch)
 
     for i, v in zip(idx, values):
         res[i] = v
@@ -28,4 +36,4 @@ def load_keys(keys: List[Optional[Key]]):
     return res
 
 
-__all__ = [Serializer, Model, Key, KeyList, Index, load_key, load_keys]
+__all__ = [Serializer, Model, Key, KeyList, ModelCache, Index, load_key, load_keys, session]
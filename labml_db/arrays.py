@@ -0,0 +1,101 @@
+"""
+Helpers for `numpy.ndarray` properties.
+Arrays are stored in the `.npy` format, which keeps the dtype and shape with the raw data.
+`numpy` is only imported when a model has array properties.
+"""
+import io
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Set, Tuple, TYPE_CHECKING, Union, get_origin, get_args
+
+from .types import ModelDict
+
+if TYPE_CHECKING:
+    import numpy as np
+
+NPY_MAGIC = b'\x93NUMPY'
+
+try:
+    from types import UnionType
+
+    _UNION_TYPES = (Union, UnionType)
+except ImportError:
+    _UNION_TYPES = (Union,)
+
+
+def is_array_annotation(annotation: Any) -> bool:
+    np = sys.modules.get('numpy', None)
+    if np is None:
+        return False
+    if annotation is np.ndarray or get_origin(annotation) is np.ndarray:
+        return True
+    # Optional[np.ndarray]
+    return get_origin(annotation) in _UNION_TYPES and any(is_array_annotation(a) for a in get_args(annotation))
+
+
+def is_array(value: Any) -> bool:
+    np = sys.modules.get('numpy', None)
+    return np is not None and isinstance(value, np.ndarray)
+
+
+def split_arrays(data: ModelDict, fields: Set[str]) -> Tuple[ModelDict, Dict[str, 'np.ndarray']]:
+    """
+    Separate array values of `fields` from the rest of the record
+    """
+    arrays = {k: data[k] for k in fields if is_array(data.get(k, None))}
+    if not arrays:
+        return data, arrays
+    return {k: v for k, v in data.items() if k not in arrays}, arrays
+
+
+def _little_endian(array: 'np.ndarray') -> 'np.ndarray':
+    if array.dtype.byteorder == '>':
+        return array.astype(array.dtype.newbyteorder('<'))
+    return array
+
+
+def array_to_bytes(array: 'np.ndarray') -> bytes:
+    import numpy as np
+    f = io.BytesIO()
+    np.save(f, _little_endian(array), allow_pickle=False)
+    return f.getvalue()
+
+
+def array_from_bytes(data: bytes) -> 'np.ndarray':
+    """
+    Read-only array backed by `data`, without copying
+    """
+    import numpy as np
+    f = io.BytesIO(data)
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    array = np.frombuffer(data, dtype=dtype, offset=f.tell(), count=int(np.prod(shape)))
+    return array.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def save_array(path: Path, array: 'np.ndarray'):
+    """
+    Write to a temporary file and rename it, so that arrays mapped from the old file stay valid
+    """
+    import numpy as np
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    with open(str(tmp), 'wb') as f:
+        np.save(f, _little_endian(array), allow_pickle=False)
+    os.replace(str(tmp), str(path))
+
+
+def load_array(path: Path) -> 'np.ndarray':
+    """
+    Memory-map an array read-only
+    """
+    import numpy as np
+    try:
+        return np.load(str(path), mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        # Empty arrays cannot be mapped
+        return np.load(str(path), allow_pickle=False)
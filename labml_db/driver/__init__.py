@@ -1,15 +1,43 @@
-from typing import List, Type, TYPE_CHECKING, Optional
+from typing import List, Type, TYPE_CHECKING, Optional, Tuple, Any, Iterator
 
-from ..types import ModelDict
+from ..types import ModelDict, Primitive
 
 if TYPE_CHECKING:
     from .. import Serializer, Model
 
 
+def merge_appended(data: Optional[ModelDict], appended: List[ModelDict]) -> Optional[ModelDict]:
+    """
+    Merge values appended to list properties into a loaded record
+    """
+    if not appended:
+        return data
+    if data is None:
+        data = {}
+    for segment in appended:
+        for k, v in segment.items():
+            current = data.get(k, None)
+            if current is None:
+                data[k] = list(v)
+            else:
+                current.extend(v)
+
+    return data
+
+
+def filter_fields(data: Optional[ModelDict], fields: List[str]) -> Optional[ModelDict]:
+    if data is None:
+        return None
+    return {k: data[k] for k in fields if k in data}
+
+
 class DbDriver:
     def __init__(self, serializer: Optional['Serializer'], model_cls: Type['Model']):
         self.model_name = model_cls.__name__
+        if serializer is not None and not model_cls._spec.key_fields:
+            serializer = serializer.without_keys()
         self._serializer = serializer
+        self._array_fields = model_cls._spec.array_fields
 
     def load_dict(self, key: str) -> Optional[ModelDict]:
         raise NotImplementedError
@@ -17,14 +45,148 @@ class DbDriver:
     def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
         raise NotImplementedError
 
+    def load_fields(self, key: str, fields: List[str]) -> Optional[ModelDict]:
+        return self.mload_fields([key], fields)[0]
+
+    def mload_fields(self, key: List[str], fields: List[str]) -> List[Optional[ModelDict]]:
+        """
+        Load only the properties in `fields`.
+        Drivers that can fetch a subset of a record should override this;
+        the fallback loads whole records and drops the other properties.
+        """
+        return [filter_fields(d, fields) for d in self.mload_dict(key)]
+
     def delete(self, key: str):
         raise NotImplementedError
 
+    def mdelete_dict(self, key: List[str]):
+        for k in key:
+            self.delete(k)
+
     def save_dict(self, key: str, data: ModelDict):
         raise NotImplementedError
 
     def msave_dict(self, key: List[str], data: List[ModelDict]):
         raise NotImplementedError
 
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        """
+        Set the properties in `data` and remove the properties in `unset`.
+        Drivers that can update fields in place should override this;
+        the fallback reads and rewrites the whole record.
+        """
+        current = self.load_dict(key)
+        if current is None:
+            current = {}
+        current.update(data)
+        for k in unset:
+            current.pop(k, None)
+        self.save_dict(key, current)
+
+    def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        for k, d, u in zip(key, data, unset):
+            self.update_fields(k, d, u)
+
+    def append_list(self, key: str, field: str, values: List[Primitive]):
+        """
+        Append `values` to the list property `field`.
+        Drivers that can append in place should override this;
+        the fallback reads and rewrites the whole record.
+        """
+        current = self.load_dict(key)
+        current = merge_appended(current, [{field: values}])
+        self.save_dict(key, current)
+
+    def mappend_list(self, key: List[str], field: str, values: List[List[Primitive]]):
+        for k, v in zip(key, values):
+            self.append_list(k, field, v)
+
     def get_all(self) -> List[str]:
         raise NotImplementedError
+
+    def count(self) -> int:
+        return len(self.get_all())
+
+    def exists(self, key: str) -> bool:
+        return self.load_dict(key) is not None
+
+    def scan_keys(self, cursor: Optional[Any], batch_size: int) -> Tuple[Optional[Any], List[str]]:
+        """
+        Returns the next batch of keys after `cursor`, and the cursor to continue from.
+        Start with `cursor=None`; a returned cursor of `None` means there are no more keys.
+
+        The fallback takes a snapshot of `get_all` on the first call and keeps it in the cursor,
+        so the scan sees the keys as they were when it started.
+        """
+        if cursor is None:
+            keys, offset = self.get_all(), 0
+        else:
+            keys, offset = cursor
+        end = offset + batch_size
+        if end >= len(keys):
+            return None, keys[offset:]
+        return (keys, end), keys[offset:end]
+
+    def iter_key_batches(self, batch_size: int, cursor: Optional[Any] = None) -> Iterator[Tuple[Optional[Any], List[str]]]:
+        """
+        Yields batches of keys along with the cursor to resume after each batch
+        """
+        while True:
+            cursor, keys = self.scan_keys(cursor, batch_size)
+            if keys:
+                yield cursor, keys
+            if cursor is None:
+                break
+
+
+class AsyncDbDriver:
+    """
+    Base class for drivers used by the `asyncio` API (`Model.aload`, `Model.asave`, ...)
+    """
+
+    def __init__(self, serializer: Optional['Serializer'], model_cls: Type['Model']):
+        self.model_name = model_cls.__name__
+        if serializer is not None and not model_cls._spec.key_fields:
+            serializer = serializer.without_keys()
+        self._serializer = serializer
+        self._array_fields = model_cls._spec.array_fields
+
+    async def load_dict(self, key: str) -> Optional[ModelDict]:
+        raise NotImplementedError
+
+    async def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def mdelete_dict(self, key: List[str]):
+        for k in key:
+            await self.delete(k)
+
+    async def save_dict(self, key: str, data: ModelDict):
+        raise NotImplementedError
+
+    async def msave_dict(self, key: List[str], data: List[ModelDict]):
+        raise NotImplementedError
+
+    async def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        current = await self.load_dict(key)
+        if current is None:
+            current = {}
+        current.update(data)
+        for k in unset:
+            current.pop(k, None)
+        await self.save_dict(key, current)
+
+    async def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        for k, d, u in zip(key, data, unset):
+            await self.update_fields(k, d, u)
+
+    async def append_list(self, key: str, field: str, values: List[Primitive]):
+        current = await self.load_dict(key)
+        current = merge_appended(current, [{field: values}])
+        await self.save_dict(key, current)
+
+    async def get_all(self) -> List[str]:
+        raise NotImplementedError
@@ -1,64 +1,583 @@
+import asyncio
 import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Type, TYPE_CHECKING, Optional
+from typing import List, Type, TYPE_CHECKING, Optional, Iterator, Tuple, Any, Iterable, Dict, Callable
 
-from . import DbDriver
-from ..types import ModelDict
+from . import DbDriver, AsyncDbDriver, merge_appended
+from ..arrays import split_arrays, save_array, load_array
+from ..types import ModelDict, Primitive
 
 if TYPE_CHECKING:
+    from concurrent.futures import Executor
     from .. import Serializer
     from ..model import Model
 
+_SEGMENT_HEADER = struct.Struct('<I')
+
+
+class _KeyManifest:
+    """
+    Log of `+key` and `-key` lines that keeps track of the stored keys,
+    so that listing them does not scan the directory.
+
+    Lines appended by other processes are read when the file grows, and the
+    whole file is read again if it was replaced. The manifest is rebuilt with `scan`
+    if it is missing or was written for a different layout (`header`).
+    """
+
+    def __init__(self, path: Path, header: str, scan: Callable[[], Iterator[str]]):
+        self._path = path
+        self._header = header
+        self._scan = scan
+        self._keys: Dict[str, None] = {}
+        self._removed = 0
+        self._inode = None
+        self._offset = 0
+        self._lock = threading.RLock()
+
+    def _refresh(self):
+        try:
+            stat = os.stat(str(self._path))
+        except FileNotFoundError:
+            return self.rebuild()
+        if stat.st_ino != self._inode or stat.st_size != self._offset:
+            self._read()
+
+    def _read(self):
+        with open(str(self._path), 'rb') as f:
+            fcntl.lockf(f, fcntl.LOCK_SH)
+            self._read_file(f)
+
+    def _read_file(self, f):
+        inode = os.fstat(f.fileno()).st_ino
+        offset = self._offset if inode == self._inode else 0
+        f.seek(offset)
+        data = f.read()
+
+        # A line that is being written is read on the next refresh
+        end = data.rfind(b'\n') + 1
+        lines = data[:end].decode('utf-8').split('\n')[:-1]
+        if offset == 0:
+            if not lines or lines[0] != self._header:
+                return self.rebuild()
+            self._keys = {}
+            self._removed = 0
+            lines = lines[1:]
+
+        for line in lines:
+            if line[0] == '+':
+                self._keys[line[1:]] = None
+            elif line[1:] in self._keys:
+                del self._keys[line[1:]]
+                self._removed += 1
+        self._inode = inode
+        self._offset = offset + end
+
+    def _write(self, keys: Iterable[str]):
+        tmp = self._path.with_name(f'{self._path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(str(tmp), 'w') as f:
+            f.write(self._header + '\n')
+            f.writelines(f'+{k}\n' for k in keys)
+        os.replace(str(tmp), str(self._path))
+
+    @contextmanager
+    def _locked(self):
+        """
+        Open the manifest locked for writing, making sure it wasn't replaced while waiting for the lock
+        """
+        while True:
+            with open(str(self._path), 'a+b') as f:
+                fcntl.lockf(f, fcntl.LOCK_EX)
+                try:
+                    replaced = os.stat(str(self._path)).st_ino != os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    replaced = True
+                if not replaced:
+                    yield f
+                    return
+
+    def rebuild(self):
+        """
+        Write the manifest from the keys found by `scan`
+        """
+        with self._lock:
+            with self._locked():
+                self._write(self._scan())
+            self._inode = None
+            self._offset = 0
+            self._read()
+
+    def _compact(self):
+        # Closing any descriptor of the file releases the lock, so the tail is read with the same one
+        with self._locked() as f:
+            self._read_file(f)
+            self._write(self._keys)
+        self._read()
+
+    def _append(self, lines: List[str]):
+        with self._locked() as f:
+            f.write(''.join(lines).encode('utf-8'))
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self._keys)
+
+    def __contains__(self, key: str):
+        with self._lock:
+            self._refresh()
+            return key in self._keys
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._keys)
+
+    def add(self, keys: List[str]):
+        with self._lock:
+            self._refresh()
+            lines = [f'+{k}\n' for k in keys if k not in self._keys]
+            if lines:
+                self._append(lines)
+                self._read()
+
+    def add_found(self, key: str):
+        """
+        Add a key found on disk, for records written without the manifest.
+        The file is only read if the key is missing from the loaded keys.
+        """
+        with self._lock:
+            if key not in self._keys:
+                self.add([key])
+
+    def remove(self, keys: List[str]):
+        with self._lock:
+            self._refresh()
+            lines = [f'-{k}\n' for k in keys if k in self._keys]
+            if lines:
+                self._append(lines)
+                self._read()
+            if self._removed > max(1024, len(self._keys)):
+                self._compact()
+
 
 class FileDbDriver(DbDriver):
-    def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], db_path: Path):
+    """
+    Stores each model in a file.
+    Values appended to list properties are written to a `.append` sidecar file,
+    which is merged on load and folded into the record on the next save.
+    Array properties are stored in `.npy` sidecar files, which are memory-mapped on load.
+
+    Records of serializers that can read from a `mmap` (`is_mappable`) are memory-mapped on load,
+    and are written to a temporary file that replaces the record, so that existing mappings stay valid.
+
+    With `shard_depth` set, records are placed in nested sub-directories named by
+    two hex characters of a hash of the key, which keeps directories small.
+    The layout of an existing directory should not be changed.
+    With `manifest` set, the keys are tracked in a manifest file,
+    so that `get_all`, `count` and `exists` don't scan the directories.
+    """
+
+    def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], db_path: Path,
+                 shard_depth: int = 0, manifest: bool = False):
         super().__init__(serializer, model_cls)
         self._db_path = db_path
+        self._shard_depth = shard_depth
+        self._shards = set()
         if not db_path.exists():
             db_path.mkdir(parents=True)
+        if manifest:
+            header = f'# labml_db {self.model_name} {self._serializer.file_extension} {shard_depth}'
+            self._manifest = _KeyManifest(db_path / f'_{self.model_name}.manifest', header, self._find_keys)
+        else:
+            self._manifest = None
+
+    def _dir(self, key: str, create: bool = False) -> Path:
+        if not self._shard_depth:
+            return self._db_path
+        digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+        shard = '/'.join(digest[2 * i:2 * i + 2] for i in range(self._shard_depth))
+        path = self._db_path / shard
+        if create and shard not in self._shards:
+            path.mkdir(parents=True, exist_ok=True)
+            self._shards.add(shard)
+        return path
+
+    def _path(self, key: str) -> Path:
+        return self._dir(key) / f'{key}.{self._serializer.file_extension}'
+
+    def _append_path(self, key: str) -> Path:
+        return self._dir(key) / f'{key}.{self._serializer.file_extension}.append'
+
+    def _read_appended(self, key: str) -> List[ModelDict]:
+        try:
+            with open(str(self._append_path(key)), 'rb') as f:
+                fcntl.lockf(f, fcntl.LOCK_SH)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        return self._parse_appended(data)
+
+    def _parse_appended(self, data: bytes) -> List[ModelDict]:
+        segments = []
+        offset = 0
+        while offset + _SEGMENT_HEADER.size <= len(data):
+            size, = _SEGMENT_HEADER.unpack_from(data, offset)
+            offset += _SEGMENT_HEADER.size
+            segment = data[offset:offset + size]
+            offset += size
+            if not self._serializer.is_bytes:
+                segment = segment.decode('utf-8')
+            segments.append(self._serializer.from_string(segment))
+
+        return segments
+
+    def _take_appended(self, key: str) -> Tuple[List[ModelDict], Optional[Path]]:
+        """
+        Move the sidecar aside and read it, so that values appended meanwhile go to a new sidecar.
+        The returned file should be removed with `_discard` once the values are saved in the record.
+        """
+        path = self._append_path(key)
+        taken = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            os.rename(str(path), str(taken))
+        except FileNotFoundError:
+            return [], None
+        with open(str(taken), 'rb+') as f:
+            # Wait for an append in progress
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            data = f.read()
+
+        return self._parse_appended(data), taken
+
+    @staticmethod
+    def _discard(taken: Optional[Path]):
+        if taken is not None:
+            taken.unlink()
+
+    def _remove_appended(self, key: str):
+        try:
+            self._append_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _array_path(self, key: str, field: str) -> Path:
+        return self._dir(key) / f'{key}.{field}.npy'
+
+    def _load_arrays(self, key: str, data: Optional[ModelDict]) -> Optional[ModelDict]:
+        if data is None:
+            return None
+        for field in self._array_fields:
+            if field in data:
+                continue
+            try:
+                data[field] = load_array(self._array_path(key, field))
+            except FileNotFoundError:
+                pass
+
+        return data
+
+    def _save_arrays(self, key: str, arrays: ModelDict, removed: Iterable[str]):
+        for field, array in arrays.items():
+            save_array(self._array_path(key, field), array)
+        for field in removed:
+            try:
+                self._array_path(key, field).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _read_mapped(self, f) -> Optional[ModelDict]:
+        if os.fstat(f.fileno()).st_size == 0:
+            return self._serializer.from_string(f.read())
+        return self._serializer.from_string(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _replace(self, path: Path, data: ModelDict):
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(str(tmp), 'wb') as f:
+            f.writelines(self._serializer.to_chunks(data))
+        os.replace(str(tmp), str(path))
 
     def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
         return [self.load_dict(k) for k in key]
 
     def load_dict(self, key: str) -> Optional[ModelDict]:
-        path = self._db_path / f'{key}.{self._serializer.file_extension}'
+        path = self._path(key)
         if not path.exists():
-            return None
-
-        if self._serializer.is_bytes:
+            data = None
+        elif self._serializer.is_mappable:
             with open(str(path), 'rb') as f:
                 fcntl.lockf(f, fcntl.LOCK_SH)
-                return self._serializer.from_string(f.read())
+                data = self._read_mapped(f)
+        elif self._serializer.is_bytes:
+            with open(str(path), 'rb') as f:
+                fcntl.lockf(f, fcntl.LOCK_SH)
+                data = self._serializer.from_string(f.read())
         else:
             with open(str(path), 'r') as f:
                 fcntl.lockf(f, fcntl.LOCK_SH)
-                return self._serializer.from_string(f.read())
+                data = self._serializer.from_string(f.read())
+
+        data = merge_appended(data, self._read_appended(key))
+        if self._array_fields:
+            data = self._load_arrays(key, data)
+        if data is not None and self._manifest is not None:
+            self._manifest.add_found(key)
+        return data
 
     def msave_dict(self, key: List[str], data: List[ModelDict]):
         for k, d in zip(key, data):
-            self.save_dict(k, d)
+            self._save_dict(k, d)
+        if self._manifest is not None:
+            self._manifest.add(key)
 
     def save_dict(self, key: str, data: ModelDict):
-        path = self._db_path / f'{key}.{self._serializer.file_extension}'
-        if self._serializer.is_bytes:
+        self._save_dict(key, data)
+        if self._manifest is not None:
+            self._manifest.add([key])
+
+    def _save_dict(self, key: str, data: ModelDict):
+        self._dir(key, True)
+        if self._array_fields:
+            data, arrays = split_arrays(data, self._array_fields)
+            self._save_arrays(key, arrays, self._array_fields - arrays.keys())
+        self._save_record(key, data)
+        # Removed after the record is written, so readers see the appended values until it is
+        # replaced, and they are kept if the write fails. Values appended later go to a new sidecar.
+        _, taken = self._take_appended(key)
+        self._discard(taken)
+
+    def _save_record(self, key: str, data: ModelDict):
+        path = self._path(key)
+        if self._serializer.is_mappable:
+            self._replace(path, data)
+        elif self._serializer.is_bytes:
             with open(str(path), 'wb') as f:
                 fcntl.lockf(f, fcntl.LOCK_EX)
-                return f.write(self._serializer.to_string(data))
+                f.write(self._serializer.to_string(data))
         else:
             with open(str(path), 'w') as f:
                 fcntl.lockf(f, fcntl.LOCK_EX)
-                return f.write(self._serializer.to_string(data))
+                f.write(self._serializer.to_string(data))
+
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        self._dir(key, True)
+        if self._array_fields:
+            data, arrays = split_arrays(data, self._array_fields)
+            removed = self._array_fields.intersection([*unset, *data])
+            self._save_arrays(key, arrays, removed)
+
+        path = self._path(key)
+        if not path.exists():
+            appended, taken = self._take_appended(key)
+            current = merge_appended({}, appended)
+            current.update(data)
+            self._save_record(key, current)
+            self._discard(taken)
+            if self._manifest is not None:
+                self._manifest.add([key])
+            return
+
+        if self._serializer.is_mappable:
+            return self._update_mapped(path, key, data, unset)
+
+        with open(str(path), 'rb+' if self._serializer.is_bytes else 'r+') as f:
+            fcntl.lockf(f, fcntl.LOCK_EX)
+            appended, taken = self._take_appended(key)
+            current = merge_appended(self._serializer.from_string(f.read()), appended)
+            current.update(data)
+            for k in unset:
+                current.pop(k, None)
+            f.seek(0)
+            f.truncate()
+            f.write(self._serializer.to_string(current))
+            self._discard(taken)
+
+    def _update_mapped(self, path: Path, key: str, data: ModelDict, unset: List[str]):
+        while True:
+            with open(str(path), 'rb+') as f:
+                fcntl.lockf(f, fcntl.LOCK_EX)
+                if os.fstat(f.fileno()).st_ino != os.stat(str(path)).st_ino:
+                    # The record was replaced while waiting for the lock
+                    continue
+                appended, taken = self._take_appended(key)
+                current = merge_appended(self._read_mapped(f), appended)
+                current.update(data)
+                for k in unset:
+                    current.pop(k, None)
+                self._replace(path, current)
+                self._discard(taken)
+                return
+
+    def append_list(self, key: str, field: str, values: List[Primitive]):
+        segment = self._serializer.to_string({field: values})
+        if not self._serializer.is_bytes:
+            segment = segment.encode('utf-8')
+        self._dir(key, True)
+        path = self._append_path(key)
+        while True:
+            with open(str(path), 'ab') as f:
+                fcntl.lockf(f, fcntl.LOCK_EX)
+                try:
+                    taken = os.stat(str(path)).st_ino != os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    taken = True
+                if not taken:
+                    f.write(_SEGMENT_HEADER.pack(len(segment)) + segment)
+                    break
+        if self._manifest is not None:
+            self._manifest.add([key])
 
     def delete(self, key: str):
-        path = self._db_path / f'{key}.{self._serializer.file_extension}'
-        path.unlink()
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            # Records with only appended values
+            self._append_path(key).unlink()
+        self._remove_appended(key)
+        self._save_arrays(key, {}, self._array_fields)
+        if self._manifest is not None:
+            self._manifest.remove([key])
+
+    def mdelete_dict(self, key: List[str]):
+        """
+        Unlike `delete`, keys without a record are ignored, as with the other drivers
+        """
+        for k in key:
+            try:
+                self._path(k).unlink()
+            except FileNotFoundError:
+                pass
+            self._remove_appended(k)
+            self._save_arrays(k, {}, self._array_fields)
+        if self._manifest is not None:
+            self._manifest.remove(key)
+
+    def _key_from_file_name(self, name: str) -> Optional[str]:
+        suffix = f'.{self._serializer.file_extension}'
+        appended = name.endswith(f'{suffix}.append')
+        if appended:
+            name = name[:-len('.append')]
+        if not name.endswith(suffix):
+            return None
+        name = name[:-len(suffix)]
+        if name.split(':')[0] != self.model_name:
+            return None
+        if appended and self._path(name).exists():
+            # Listed with its record
+            return None
+        return name
+
+    def _iter_file_names(self, path: Path, depth: int) -> Iterator[str]:
+        with os.scandir(str(path)) as it:
+            entries = sorted(it, key=lambda e: e.name) if depth else it
+            for entry in entries:
+                if not depth:
+                    yield entry.name
+                elif len(entry.name) == 2 and entry.is_dir():
+                    yield from self._iter_file_names(Path(entry.path), depth - 1)
+
+    def _find_keys(self) -> Iterator[str]:
+        for name in self._iter_file_names(self._db_path, self._shard_depth):
+            key = self._key_from_file_name(name)
+            if key is not None:
+                yield key
 
     def get_all(self) -> List[str]:
+        if self._manifest is not None:
+            return self._manifest.keys()
+        return list(self._find_keys())
+
+    def count(self) -> int:
+        if self._manifest is not None:
+            return len(self._manifest)
+        return sum(1 for _ in self._find_keys())
+
+    def exists(self, key: str) -> bool:
+        if self._manifest is not None:
+            return key in self._manifest
+        return self._path(key).exists() or self._append_path(key).exists()
+
+    def rebuild_manifest(self):
+        self._manifest.rebuild()
+
+    def scan_keys(self, cursor: Optional[int], batch_size: int) -> Tuple[Optional[int], List[str]]:
+        for cursor, keys in self.iter_key_batches(batch_size, cursor):
+            return cursor, keys
+        return None, []
+
+    def iter_key_batches(self, batch_size: int, cursor: Optional[int] = None) -> Iterator[Tuple[Optional[Any], List[str]]]:
+        """
+        The cursor is the number of directory entries (or manifest keys) already scanned,
+        so resuming is only exact if the directory has not changed.
+        """
+        position = cursor or 0
+        if self._manifest is not None:
+            keys = self._manifest.keys()
+            for i in range(position, len(keys), batch_size):
+                yield (i + batch_size if i + batch_size < len(keys) else None), keys[i:i + batch_size]
+            return
+
         keys = []
-        for file in self._db_path.iterdir():
-            name = file.stem
-            if name.split(':')[0] != self.model_name:
+        for i, name in enumerate(self._iter_file_names(self._db_path, self._shard_depth)):
+            if i < position:
                 continue
-            keys.append(name)
+            key = self._key_from_file_name(name)
+            if key is not None:
+                keys.append(key)
+            if len(keys) == batch_size:
+                yield i + 1, keys
+                keys = []
+
+        yield None, keys
+
+
+class AsyncFileDbDriver(AsyncDbDriver):
+    """
+    Runs `FileDbDriver` operations on a thread pool so that they don't block the event loop
+    """
+
+    def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], db_path: Path,
+                 executor: Optional['Executor'] = None, shard_depth: int = 0, manifest: bool = False):
+        super().__init__(serializer, model_cls)
+        self._driver = FileDbDriver(serializer, model_cls, db_path, shard_depth, manifest)
+        self._executor = executor
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def load_dict(self, key: str) -> Optional[ModelDict]:
+        return await self._run(self._driver.load_dict, key)
+
+    async def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        return await self._run(self._driver.mload_dict, key)
+
+    async def delete(self, key: str):
+        await self._run(self._driver.delete, key)
+
+    async def mdelete_dict(self, key: List[str]):
+        await self._run(self._driver.mdelete_dict, key)
+
+    async def save_dict(self, key: str, data: ModelDict):
+        await self._run(self._driver.save_dict, key, data)
+
+    async def msave_dict(self, key: List[str], data: List[ModelDict]):
+        await self._run(self._driver.msave_dict, key, data)
+
+    async def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        await self._run(self._driver.update_fields, key, data, unset)
+
+    async def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        await self._run(self._driver.mupdate_fields, key, data, unset)
+
+    async def append_list(self, key: str, field: str, values: List[Primitive]):
+        await self._run(self._driver.append_list, key, field, values)
 
-        return keys
+    async def get_all(self) -> List[str]:
+        return await self._run(self._driver.get_all)
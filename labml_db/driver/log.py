@@ -0,0 +1,399 @@
+import fcntl
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Type, TYPE_CHECKING, Optional, Dict, Tuple, Any
+
+from . import DbDriver
+from ..types import ModelDict, Primitive
+
+if TYPE_CHECKING:
+    from .. import Serializer
+    from ..model import Model
+
+_MAGIC = b'LDBLOG1\x00'
+# magic, id of the first segment this segment replaces
+_SEGMENT_HEADER = struct.Struct('<8sI')
+# crc32, flags, key length, value length
+_RECORD_HEADER = struct.Struct('<IBHI')
+_HINT_MAGIC = b'LDBHNT2\x00'
+# magic, segment size, id of the first segment replaced, crc32 of the entries
+_HINT_HEADER = struct.Struct('<8sQII')
+# flags, key length, value offset, value length
+_HINT_ENTRY = struct.Struct('<BHQI')
+
+_PUT = 0
+_DELETE = 1
+
+_Location = Tuple[int, int, int]
+
+
+class LogDbDriver(DbDriver):
+    """
+    Log-structured storage in a directory of append-only segment files.
+
+    Saves append records to the active segment, deletes append tombstones,
+    and an in-memory index maps keys to the location of their latest value,
+    so reads are a single `pread`. Segments larger than `max_segment_size` are closed,
+    with a hint file of their index entries to load the index from on startup.
+
+    `compact` rewrites the closed segments with only the live records. It runs when
+    a segment is closed if more than `compact_ratio` of the closed data is garbage.
+
+    A lock file allows one process to open the directory at a time.
+    """
+
+    def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], db_path: Path,
+                 max_segment_size: int = 64 * 1024 * 1024, compact_ratio: Optional[float] = 0.5,
+                 sync: bool = False):
+        super().__init__(serializer, model_cls)
+        self._db_path = db_path
+        self._max_segment_size = max_segment_size
+        self._compact_ratio = compact_ratio
+        self._sync = sync
+        self._lock = threading.RLock()
+        if not db_path.exists():
+            db_path.mkdir(parents=True)
+
+        self._lock_file = open(str(db_path / 'LOCK'), 'wb')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f'{db_path} is used by another process')
+
+        self._index: Dict[str, _Location] = {}
+        self._sizes: Dict[int, int] = {}
+        self._readers: Dict[int, int] = {}
+        self._garbage = 0
+        self._open()
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._db_path / f'{segment:08d}.log'
+
+    def _hint_path(self, segment: int) -> Path:
+        return self._db_path / f'{segment:08d}.hint'
+
+    def _open(self):
+        for pattern in ('*.compact', '*.tmp'):
+            for path in self._db_path.glob(pattern):
+                path.unlink()
+        segments = sorted(int(p.stem) for p in self._db_path.glob('*.log'))
+        bases = {s: self._read_base(s) for s in segments}
+        # Segments replaced by a compacted segment, left over if compaction was interrupted
+        obsolete = {s for s in segments for c in segments if bases[c] <= s < c}
+        for s in obsolete:
+            self._remove_segment(s)
+        segments = [s for s in segments if s not in obsolete]
+
+        entries = []
+        for s in segments:
+            entries = self._read_hint(s, bases[s])
+            if entries is None:
+                entries = self._scan(s, s == segments[-1])
+                if s != segments[-1]:
+                    self._write_hint(s, bases[s], entries)
+            for flags, key, location in entries:
+                self._apply(flags, key, location)
+
+        if segments and bases[segments[-1]] == segments[-1] and self._sizes[segments[-1]] < self._max_segment_size:
+            self._active = segments[-1]
+            # Index entries of the active segment, for its hint file
+            self._active_entries = entries
+        else:
+            self._active = segments[-1] + 1 if segments else 0
+            self._create_segment(self._active, self._active)
+            self._active_entries = []
+        self._writer = open(str(self._segment_path(self._active)), 'ab')
+
+    def _read_base(self, segment: int) -> int:
+        with open(str(self._segment_path(segment)), 'rb') as f:
+            header = f.read(_SEGMENT_HEADER.size)
+        if len(header) < _SEGMENT_HEADER.size:
+            # Interrupted while the segment was created
+            self._create_segment(segment, segment)
+            return segment
+        magic, base = _SEGMENT_HEADER.unpack(header)
+        if magic != _MAGIC:
+            raise RuntimeError(f'{self._segment_path(segment)} is not a segment file')
+        return base
+
+    def _create_segment(self, segment: int, base: int):
+        with open(str(self._segment_path(segment)), 'wb') as f:
+            f.write(_SEGMENT_HEADER.pack(_MAGIC, base))
+        self._sizes[segment] = _SEGMENT_HEADER.size
+
+    def _apply(self, flags: int, key: str, location: _Location):
+        old = self._index.pop(key, None)
+        if old is not None:
+            self._garbage += _RECORD_HEADER.size + len(key.encode('utf-8')) + old[2]
+        if flags == _PUT:
+            self._index[key] = location
+
+    def _scan(self, segment: int, is_active: bool) -> List[Tuple[int, str, _Location]]:
+        """
+        Read the index entries of a segment without a hint file.
+        A record cut short at the end of the last segment, by a crash, is truncated.
+        """
+        with open(str(self._segment_path(segment)), 'rb') as f:
+            data = f.read()
+
+        entries = []
+        offset = _SEGMENT_HEADER.size
+        while offset + _RECORD_HEADER.size <= len(data):
+            crc, flags, key_size, value_size = _RECORD_HEADER.unpack_from(data, offset)
+            end = offset + _RECORD_HEADER.size + key_size + value_size
+            if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+                break
+            key_start = offset + _RECORD_HEADER.size
+            key = data[key_start:key_start + key_size].decode('utf-8')
+            entries.append((flags, key, (segment, key_start + key_size, value_size)))
+            offset = end
+
+        if offset < len(data):
+            if not is_active:
+                raise RuntimeError(f'{self._segment_path(segment)} is corrupted at {offset}')
+            with open(str(self._segment_path(segment)), 'rb+') as f:
+                f.truncate(offset)
+        self._sizes[segment] = max(offset, _SEGMENT_HEADER.size)
+
+        return entries
+
+    def _read_hint(self, segment: int, base: int) -> Optional[List[Tuple[int, str, _Location]]]:
+        """
+        Read the index entries of a segment from its hint file;
+        returns `None` if the hint is missing, stale or malformed
+        """
+        try:
+            with open(str(self._hint_path(segment)), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if len(data) < _HINT_HEADER.size:
+            return None
+        magic, size, hint_base, crc = _HINT_HEADER.unpack_from(data)
+        if (magic != _HINT_MAGIC or hint_base != base or
+                size != os.stat(str(self._segment_path(segment))).st_size or
+                zlib.crc32(data[_HINT_HEADER.size:]) != crc):
+            return None
+
+        entries = []
+        offset = _HINT_HEADER.size
+        while offset < len(data):
+            if offset + _HINT_ENTRY.size > len(data):
+                return None
+            flags, key_size, value_offset, value_size = _HINT_ENTRY.unpack_from(data, offset)
+            offset += _HINT_ENTRY.size + key_size
+            if offset > len(data) or value_offset + value_size > size:
+                return None
+            key = data[offset - key_size:offset].decode('utf-8')
+            entries.append((flags, key, (segment, value_offset, value_size)))
+        self._sizes[segment] = size
+
+        return entries
+
+    def _write_hint(self, segment: int, base: int, entries: List[Tuple[int, str, _Location]],
+                    path: Optional[Path] = None):
+        chunks = []
+        for flags, key, (_, offset, size) in entries:
+            key = key.encode('utf-8')
+            chunks.append(_HINT_ENTRY.pack(flags, len(key), offset, size) + key)
+        data = b''.join(chunks)
+        path = path or self._hint_path(segment)
+        tmp = path.with_name(f'{path.name}.tmp')
+        with open(str(tmp), 'wb') as f:
+            f.write(_HINT_HEADER.pack(_HINT_MAGIC, self._sizes[segment], base, zlib.crc32(data)))
+            f.write(data)
+        os.replace(str(tmp), str(path))
+
+    @staticmethod
+    def _record(flags: int, key: bytes, value: bytes) -> bytes:
+        body = struct.pack('<BHI', flags, len(key), len(value)) + key + value
+        return struct.pack('<I', zlib.crc32(body)) + body
+
+    def _append(self, records: List[Tuple[int, str, bytes]]):
+        """
+        Write records to the active segment with a single write, and update the index
+        """
+        chunks = []
+        locations = []
+        offset = self._sizes[self._active]
+        for flags, key, value in records:
+            key_bytes = key.encode('utf-8')
+            chunks.append(self._record(flags, key_bytes, value))
+            locations.append((flags, key, (self._active, offset + _RECORD_HEADER.size + len(key_bytes), len(value))))
+            offset += len(chunks[-1])
+
+        self._writer.write(b''.join(chunks))
+        self._writer.flush()
+        if self._sync:
+            os.fsync(self._writer.fileno())
+        self._sizes[self._active] = offset
+        self._active_entries += locations
+        for flags, key, location in locations:
+            self._apply(flags, key, location)
+
+        if offset >= self._max_segment_size:
+            self._close_active()
+            closed_size = sum(s for k, s in self._sizes.items() if k != self._active)
+            if self._compact_ratio is not None and self._garbage > self._compact_ratio * closed_size:
+                self._compact()
+
+    def _close_active(self):
+        """
+        Write the hint file of the active segment and start a new one
+        """
+        self._writer.close()
+        closed = self._active
+        self._write_hint(closed, closed, self._active_entries)
+        self._active = closed + 1
+        self._active_entries = []
+        self._create_segment(self._active, self._active)
+        self._writer = open(str(self._segment_path(self._active)), 'ab')
+
+    def _reader(self, segment: int) -> int:
+        if segment not in self._readers:
+            self._readers[segment] = os.open(str(self._segment_path(segment)), os.O_RDONLY)
+        return self._readers[segment]
+
+    def _read(self, location: _Location) -> Optional[ModelDict]:
+        segment, offset, size = location
+        value = os.pread(self._reader(segment), size, offset)
+        if not self._serializer.is_bytes:
+            value = value.decode('utf-8')
+        return self._serializer.from_string(value)
+
+    def _dump(self, data: ModelDict) -> bytes:
+        value = self._serializer.to_string(data)
+        if not self._serializer.is_bytes:
+            value = value.encode('utf-8')
+        return value
+
+    def load_dict(self, key: str) -> Optional[ModelDict]:
+        with self._lock:
+            location = self._index.get(key, None)
+            if location is None:
+                return None
+            return self._read(location)
+
+    def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        with self._lock:
+            return [self.load_dict(k) for k in key]
+
+    def save_dict(self, key: str, data: ModelDict):
+        self.msave_dict([key], [data])
+
+    def msave_dict(self, key: List[str], data: List[ModelDict]):
+        records = [(_PUT, k, self._dump(d)) for k, d in zip(key, data)]
+        with self._lock:
+            self._append(records)
+
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        with self._lock:
+            super().update_fields(key, data, unset)
+
+    def append_list(self, key: str, field: str, values: List[Primitive]):
+        with self._lock:
+            super().append_list(key, field, values)
+
+    def delete(self, key: str):
+        self.mdelete_dict([key])
+
+    def mdelete_dict(self, key: List[str]):
+        with self._lock:
+            records = [(_DELETE, k, b'') for k in key if k in self._index]
+            if records:
+                self._append(records)
+
+    def get_all(self) -> List[str]:
+        with self._lock:
+            return list(self._index)
+
+    def count(self) -> int:
+        return len(self._index)
+
+    def exists(self, key: str) -> bool:
+        return key in self._index
+
+    def scan_keys(self, cursor: Optional[Any], batch_size: int) -> Tuple[Optional[Any], List[str]]:
+        """
+        The first call copies the keys of the in-memory index into the cursor,
+        and later calls page through that copy
+        """
+        if cursor is None:
+            with self._lock:
+                cursor = (list(self._index), 0)
+        keys, offset = cursor
+        end = offset + batch_size
+        if end >= len(keys):
+            return None, keys[offset:]
+        return (keys, end), keys[offset:end]
+
+    def _remove_segment(self, segment: int):
+        fd = self._readers.pop(segment, None)
+        if fd is not None:
+            os.close(fd)
+        self._sizes.pop(segment, None)
+        for path in (self._segment_path(segment), self._hint_path(segment)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def compact(self):
+        """
+        Rewrite the closed segments with only the live records
+        """
+        with self._lock:
+            if self._sizes[self._active] > _SEGMENT_HEADER.size:
+                self._close_active()
+            self._compact()
+
+    def _compact(self):
+        closed = sorted(s for s in self._sizes if s != self._active)
+        if not closed:
+            return
+        first, last = closed[0], closed[-1]
+
+        # The compacted segment takes the id of the last closed segment, and replaces all of them
+        path = self._db_path / f'{last:08d}.log.compact'
+        live = [(k, loc) for k, loc in self._index.items() if loc[0] in self._sizes and loc[0] != self._active]
+        entries = []
+        offset = _SEGMENT_HEADER.size
+        with open(str(path), 'wb') as f:
+            f.write(_SEGMENT_HEADER.pack(_MAGIC, first))
+            for k, (segment, value_offset, size) in live:
+                key_bytes = k.encode('utf-8')
+                record = self._record(_PUT, key_bytes, os.pread(self._reader(segment), size, value_offset))
+                f.write(record)
+                entries.append((_PUT, k, (last, offset + _RECORD_HEADER.size + len(key_bytes), size)))
+                offset += len(record)
+            f.flush()
+            os.fsync(f.fileno())
+
+        for s in closed:
+            fd = self._readers.pop(s, None)
+            if fd is not None:
+                os.close(fd)
+        self._sizes[last] = offset
+        hint_path = self._db_path / f'{last:08d}.hint.compact'
+        self._write_hint(last, first, entries, hint_path)
+        os.replace(str(path), str(self._segment_path(last)))
+        os.replace(str(hint_path), str(self._hint_path(last)))
+        for s in closed[:-1]:
+            self._remove_segment(s)
+
+        for _, k, location in entries:
+            self._index[k] = location
+        self._garbage = 0
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers = {}
+            self._lock_file.close()
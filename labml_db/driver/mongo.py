@@ -1,19 +1,56 @@
-from typing import List, Type, TYPE_CHECKING, Optional, Dict
+from typing import List, Type, TYPE_CHECKING, Optional, Dict, Tuple, Iterator
 
-from labml_db.serializer.utils import encode_keys, decode_keys
+from labml_db.serializer.utils import encode_key, decode_keys
 
-from . import DbDriver
-from ..types import ModelDict
+from . import DbDriver, AsyncDbDriver
+from ..arrays import is_array, array_to_bytes, array_from_bytes
+from ..model import Key
+from ..types import ModelDict, Primitive
 
 if TYPE_CHECKING:
+    import bson.codec_options
+    import motor.motor_asyncio
     import pymongo
     from ..model import Model
 
+_key_type_registry: Optional['bson.codec_options.TypeRegistry'] = None
 
-class MongoDbDriver(DbDriver):
-    def __init__(self, model_cls: Type['Model'], db: 'pymongo.mongo_client.database.Database'):
-        super().__init__(None, model_cls)
-        self._collection = db[self.model_name]
+
+def _get_key_type_registry() -> 'bson.codec_options.TypeRegistry':
+    """
+    BSON type registry that encodes `Key`s while documents are serialized by the Mongo client
+    """
+    global _key_type_registry
+    if _key_type_registry is None:
+        from bson.codec_options import TypeEncoder, TypeRegistry
+
+        class KeyEncoder(TypeEncoder):
+            python_type = Key
+
+            def transform_python(self, value: Key):
+                return encode_key(value)
+
+        _key_type_registry = TypeRegistry([KeyEncoder()])
+
+    return _key_type_registry
+
+
+class _MongoDocuments:
+    """
+    Conversions between model dictionaries and Mongo documents,
+    shared by the sync and async drivers.
+
+    `Key`s are encoded by the BSON codec of the collection. Properties with annotations
+    that can't hold keys are not decoded; all others, including properties
+    without an annotation, are.
+    Arrays are stored as binary values in `.npy` format.
+    """
+
+    def _init_collection(self, model_cls: Type['Model'], db):
+        codec_options = db.codec_options.with_options(type_registry=_get_key_type_registry())
+        self._collection = db.get_collection(self.model_name, codec_options=codec_options)
+        spec = model_cls._spec
+        self._plain_fields = {k for k in spec.annotations if k not in spec.key_fields}
 
     def _to_obj_id(self, key: str):
         return str(key)
@@ -27,14 +64,43 @@ class MongoDbDriver(DbDriver):
         if data is None:
             return None
         del data['_id']
-        return decode_keys(data)
+        for k, v in data.items():
+            if k not in self._plain_fields:
+                data[k] = decode_keys(v)
+        for k in self._array_fields:
+            if isinstance(data.get(k, None), bytes):
+                data[k] = array_from_bytes(data[k])
+        return data
+
+    def _dump_arrays(self, data: ModelDict) -> ModelDict:
+        for k in self._array_fields:
+            if is_array(data.get(k, None)):
+                data[k] = array_to_bytes(data[k])
+        return data
 
     def _dump_data(self, key: str, data: ModelDict):
         d: Dict = data.copy()
-        d = encode_keys(d)
         d['_id'] = self._to_obj_id(key)
 
-        return d
+        return self._dump_arrays(d)
+
+    def _update_doc(self, data: ModelDict, unset: List[str]) -> Dict:
+        update = {}
+        if data:
+            update['$set'] = self._dump_arrays(data.copy()) if self._array_fields else data
+        if unset:
+            update['$unset'] = {k: '' for k in unset}
+        return update
+
+    @staticmethod
+    def _push_doc(field: str, values: List[Primitive]) -> Dict:
+        return {'$push': {field: {'$each': values}}}
+
+
+class MongoDbDriver(_MongoDocuments, DbDriver):
+    def __init__(self, model_cls: Type['Model'], db: 'pymongo.mongo_client.database.Database'):
+        super().__init__(None, model_cls)
+        self._init_collection(model_cls, db)
 
     def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
         obj_keys = [self._to_obj_id(k) for k in key]
@@ -51,6 +117,21 @@ class MongoDbDriver(DbDriver):
         d = self._collection.find_one({'_id': self._to_obj_id(key)})
         return self._load_data(d)
 
+    def mload_fields(self, key: List[str], fields: List[str]) -> List[Optional[ModelDict]]:
+        obj_keys = [self._to_obj_id(k) for k in key]
+        cursor = self._collection.find({'_id': {'$in': obj_keys}}, projection={f: 1 for f in fields})
+        res = [None for _ in key]
+        idx = {k: i for i, k in enumerate(obj_keys)}
+        for d in cursor:
+            i = idx[d['_id']]
+            res[i] = self._load_data(d)
+
+        return res
+
+    def load_fields(self, key: str, fields: List[str]) -> Optional[ModelDict]:
+        d = self._collection.find_one({'_id': self._to_obj_id(key)}, projection={f: 1 for f in fields})
+        return self._load_data(d)
+
     def msave_dict(self, key: List[str], data: List[ModelDict]):
         objs = [self._dump_data(k, d) for k, d in zip(key, data)]
 
@@ -63,10 +144,128 @@ class MongoDbDriver(DbDriver):
 
         self._collection.replace_one({'_id': obj['_id']}, obj, True)
 
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        update = self._update_doc(data, unset)
+        if not update:
+            return
+        self._collection.update_one({'_id': self._to_obj_id(key)}, update, True)
+
+    def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        from pymongo import UpdateOne
+        updates = [UpdateOne({'_id': self._to_obj_id(k)}, self._update_doc(d, u), True)
+                   for k, d, u in zip(key, data, unset) if d or u]
+        if updates:
+            self._collection.bulk_write(updates, False)
+
+    def append_list(self, key: str, field: str, values: List[Primitive]):
+        self._collection.update_one({'_id': self._to_obj_id(key)}, self._push_doc(field, values), True)
+
+    def mappend_list(self, key: List[str], field: str, values: List[List[Primitive]]):
+        from pymongo import UpdateOne
+        updates = [UpdateOne({'_id': self._to_obj_id(k)}, self._push_doc(field, v), True)
+                   for k, v in zip(key, values)]
+        if updates:
+            self._collection.bulk_write(updates, False)
+
     def delete(self, key: str):
         self._collection.delete_one({'_id': self._to_obj_id(key)})
 
+    def mdelete_dict(self, key: List[str]):
+        self._collection.delete_many({'_id': {'$in': [self._to_obj_id(k) for k in key]}})
+
     def get_all(self) -> List[str]:
         cur = self._collection.find(projection=['_id'])
         keys = [self._to_key(d['_id']) for d in cur]
         return keys
+
+    def count(self) -> int:
+        return self._collection.count_documents({})
+
+    def exists(self, key: str) -> bool:
+        return self._collection.find_one({'_id': self._to_obj_id(key)}, projection=['_id']) is not None
+
+    def _find_after(self, cursor: Optional[str]) -> 'pymongo.cursor.Cursor':
+        query = {} if cursor is None else {'_id': {'$gt': cursor}}
+        return self._collection.find(query, projection=['_id']).sort('_id', 1)
+
+    def scan_keys(self, cursor: Optional[str], batch_size: int) -> Tuple[Optional[str], List[str]]:
+        ids = [d['_id'] for d in self._find_after(cursor).limit(batch_size)]
+        if len(ids) < batch_size:
+            return None, [self._to_key(i) for i in ids]
+        return ids[-1], [self._to_key(i) for i in ids]
+
+    def iter_key_batches(self, batch_size: int, cursor: Optional[str] = None) -> Iterator[Tuple[Optional[str], List[str]]]:
+        """
+        The cursor is the last `_id` returned, so iteration can be resumed with a range query
+        """
+        ids = []
+        for d in self._find_after(cursor).batch_size(batch_size):
+            ids.append(d['_id'])
+            if len(ids) == batch_size:
+                yield ids[-1], [self._to_key(i) for i in ids]
+                ids = []
+
+        yield None, [self._to_key(i) for i in ids]
+
+
+class AsyncMongoDbDriver(_MongoDocuments, AsyncDbDriver):
+    """
+    Mongo driver for the `asyncio` API, using a `motor` database
+    """
+
+    def __init__(self, model_cls: Type['Model'], db: 'motor.motor_asyncio.AsyncIOMotorDatabase'):
+        super().__init__(None, model_cls)
+        self._init_collection(model_cls, db)
+
+    async def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        obj_keys = [self._to_obj_id(k) for k in key]
+        cursor = self._collection.find({'_id': {'$in': obj_keys}})
+        res = [None for _ in key]
+        idx = {k: i for i, k in enumerate(obj_keys)}
+        async for d in cursor:
+            i = idx[d['_id']]
+            res[i] = self._load_data(d)
+
+        return res
+
+    async def load_dict(self, key: str) -> Optional[ModelDict]:
+        d = await self._collection.find_one({'_id': self._to_obj_id(key)})
+        return self._load_data(d)
+
+    async def msave_dict(self, key: List[str], data: List[ModelDict]):
+        objs = [self._dump_data(k, d) for k, d in zip(key, data)]
+
+        from pymongo import ReplaceOne
+        replacements = [ReplaceOne({'_id': d['_id']}, d, True) for d in objs]
+        await self._collection.bulk_write(replacements, False)
+
+    async def save_dict(self, key: str, data: ModelDict):
+        obj = self._dump_data(key, data)
+
+        await self._collection.replace_one({'_id': obj['_id']}, obj, True)
+
+    async def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        update = self._update_doc(data, unset)
+        if not update:
+            return
+        await self._collection.update_one({'_id': self._to_obj_id(key)}, update, True)
+
+    async def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        from pymongo import UpdateOne
+        updates = [UpdateOne({'_id': self._to_obj_id(k)}, self._update_doc(d, u), True)
+                   for k, d, u in zip(key, data, unset) if d or u]
+        if updates:
+            await self._collection.bulk_write(updates, False)
+
+    async def append_list(self, key: str, field: str, values: List[Primitive]):
+        await self._collection.update_one({'_id': self._to_obj_id(key)}, self._push_doc(field, values), True)
+
+    async def delete(self, key: str):
+        await self._collection.delete_one({'_id': self._to_obj_id(key)})
+
+    async def mdelete_dict(self, key: List[str]):
+        await self._collection.delete_many({'_id': {'$in': [self._to_obj_id(k) for k in key]}})
+
+    async def get_all(self) -> List[str]:
+        cur = self._collection.find(projection=['_id'])
+        return [self._to_key(d['_id']) async for d in cur]
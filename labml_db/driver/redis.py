@@ -1,15 +1,70 @@
-from typing import List, Type, TYPE_CHECKING, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Type, TYPE_CHECKING, Optional, Dict, Tuple, Iterator
 
-from . import DbDriver
-from ..types import ModelDict
+from . import DbDriver, AsyncDbDriver, merge_appended, filter_fields
+from ..arrays import split_arrays, array_to_bytes, array_from_bytes, is_array, NPY_MAGIC
+from ..types import ModelDict, Primitive
 
 if TYPE_CHECKING:
     import redis
+    import redis.asyncio
     from .. import Serializer
     from ..model import Model
 
+_pipelines: ContextVar[Dict[int, 'redis.client.Pipeline']] = ContextVar('labml_db_redis_pipelines', default={})
+
+
+@contextmanager
+def pipeline(db: 'redis.Redis', transaction: bool = True) -> Iterator['redis.client.Pipeline']:
+    """
+    Queue the writes of all Redis model and index drivers that use `db`,
+    and send them in a single round trip (in a `MULTI` block if `transaction` is set) on exit.
+    Nothing is sent if an exception is raised. Reads are not queued.
+    """
+    pipelines = _pipelines.get()
+    if id(db) in pipelines:
+        yield pipelines[id(db)]
+        return
+
+    pipe = db.pipeline(transaction=transaction)
+    token = _pipelines.set({**pipelines, id(db): pipe})
+    try:
+        yield pipe
+    finally:
+        _pipelines.reset(token)
+
+    pipe.execute()
+
+
+def active_pipeline(db: 'redis.Redis') -> Optional['redis.client.Pipeline']:
+    return _pipelines.get().get(id(db), None)
+
+
+@contextmanager
+def write_pipeline(db: 'redis.Redis') -> Iterator['redis.client.Pipeline']:
+    """
+    Pipeline for the writes of one driver operation.
+    It is the active `pipeline` for `db` if there is one; otherwise it is executed on exit.
+    """
+    pipe = active_pipeline(db)
+    if pipe is not None:
+        yield pipe
+        return
+
+    pipe = db.pipeline()
+    yield pipe
+    pipe.execute()
+
 
 class RedisDbDriver(DbDriver):
+    """
+    Stores each model as a serialized value.
+    Values appended to list properties are pushed to a `_append:` list,
+    which is merged on load and folded into the record on the next save.
+    Array properties are stored in `.npy` format in an `_arrays:` hash.
+    """
+
     def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], db: 'redis.Redis'):
         super().__init__(serializer, model_cls)
         self._db = db
@@ -18,25 +73,389 @@ class RedisDbDriver(DbDriver):
     def _keys_list_key(self):
         return f'_keys:{self.model_name}'
 
+    @staticmethod
+    def _append_key(key: str):
+        return f'_append:{key}'
+
+    @staticmethod
+    def _arrays_key(key: str):
+        return f'_arrays:{key}'
+
+    def _load_appended(self, segments: List[bytes]) -> List[ModelDict]:
+        return [self._serializer.from_string(s) for s in segments]
+
+    @staticmethod
+    def _load_arrays(data: Optional[ModelDict], arrays: Dict[bytes, bytes]) -> Optional[ModelDict]:
+        if data is None:
+            return None
+        for k, v in arrays.items():
+            k = k.decode('utf-8')
+            if k not in data:
+                data[k] = array_from_bytes(v)
+
+        return data
+
+    def _queue_arrays(self, pipe: 'redis.client.Pipeline', key: str, data: ModelDict, unset: List[str],
+                      replace: bool) -> ModelDict:
+        """
+        Queue the writes of array properties, and return the rest of the record
+        """
+        data, arrays = split_arrays(data, self._array_fields)
+        if replace:
+            pipe.delete(self._arrays_key(key))
+        else:
+            removed = self._array_fields.intersection([*unset, *data])
+            if removed:
+                pipe.hdel(self._arrays_key(key), *removed)
+        if arrays:
+            pipe.hset(self._arrays_key(key), mapping={k: array_to_bytes(v) for k, v in arrays.items()})
+
+        return data
+
     def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
-        data = self._db.mget(key)
-        return [self._serializer.from_string(d) for d in data]
+        pipe = self._db.pipeline(transaction=False)
+        pipe.mget(key)
+        for k in key:
+            pipe.lrange(self._append_key(k), 0, -1)
+        if self._array_fields:
+            for k in key:
+                pipe.hgetall(self._arrays_key(k))
+        data, *res = pipe.execute()
+        loaded = [merge_appended(self._serializer.from_string(d), self._load_appended(a))
+                  for d, a in zip(data, res)]
+        if self._array_fields:
+            loaded = [self._load_arrays(d, a) for d, a in zip(loaded, res[len(key):])]
+        return loaded
 
     def load_dict(self, key: str) -> Optional[ModelDict]:
-        return self._serializer.from_string(self._db.get(key))
+        return self.mload_dict([key])[0]
 
     def msave_dict(self, key: List[str], data: List[ModelDict]):
-        self._db.sadd(self._keys_list_key, *key)
-        self._db.mset({k: self._serializer.to_string(d) for k, d in zip(key, data)})
+        with write_pipeline(self._db) as pipe:
+            if self._array_fields:
+                data = [self._queue_arrays(pipe, k, d, [], True) for k, d in zip(key, data)]
+            pipe.sadd(self._keys_list_key, *key)
+            pipe.mset({k: self._serializer.to_string(d) for k, d in zip(key, data)})
+            pipe.delete(*[self._append_key(k) for k in key])
 
     def save_dict(self, key: str, data: ModelDict):
-        self._db.sadd(self._keys_list_key, key)
-        self._db.set(key, self._serializer.to_string(data))
+        with write_pipeline(self._db) as pipe:
+            if self._array_fields:
+                data = self._queue_arrays(pipe, key, data, [], True)
+            pipe.sadd(self._keys_list_key, key)
+            pipe.set(key, self._serializer.to_string(data))
+            pipe.delete(self._append_key(key))
+
+    def _merge_update(self, reader: 'redis.Redis', key: str, data: ModelDict, unset: List[str]) -> ModelDict:
+        current = self._serializer.from_string(reader.get(key))
+        current = merge_appended(current, self._load_appended(reader.lrange(self._append_key(key), 0, -1)))
+        if current is None:
+            current = {}
+        current.update(data)
+        for k in unset:
+            current.pop(k, None)
+
+        return current
+
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        pipe = active_pipeline(self._db)
+        if pipe is not None:
+            if self._array_fields:
+                data = self._queue_arrays(pipe, key, data, unset, False)
+            # The record is read outside the active pipeline, so this update is not atomic
+            current = self._merge_update(self._db, key, data, unset)
+            pipe.sadd(self._keys_list_key, key)
+            pipe.set(key, self._serializer.to_string(current))
+            pipe.delete(self._append_key(key))
+            return
+
+        def _update(pipe: 'redis.client.Pipeline'):
+            current = self._merge_update(pipe, key, split_arrays(data, self._array_fields)[0], unset)
+            pipe.multi()
+            if self._array_fields:
+                self._queue_arrays(pipe, key, data, unset, False)
+            pipe.sadd(self._keys_list_key, key)
+            pipe.set(key, self._serializer.to_string(current))
+            pipe.delete(self._append_key(key))
+
+        self._db.transaction(_update, key, self._append_key(key))
+
+    def append_list(self, key: str, field: str, values: List[Primitive]):
+        self.mappend_list([key], field, [values])
+
+    def mappend_list(self, key: List[str], field: str, values: List[List[Primitive]]):
+        with write_pipeline(self._db) as pipe:
+            pipe.sadd(self._keys_list_key, *key)
+            for k, v in zip(key, values):
+                pipe.rpush(self._append_key(k), self._serializer.to_string({field: v}))
 
     def delete(self, key: str):
-        self._db.srem(self._keys_list_key, key)
-        self._db.delete(key)
+        self.mdelete_dict([key])
+
+    def mdelete_dict(self, key: List[str]):
+        if not key:
+            return
+        with write_pipeline(self._db) as pipe:
+            pipe.srem(self._keys_list_key, *key)
+            pipe.delete(*key, *[self._append_key(k) for k in key])
+            if self._array_fields:
+                pipe.delete(*[self._arrays_key(k) for k in key])
 
     def get_all(self) -> List[str]:
         keys = self._db.smembers(self._keys_list_key)
         return [k.decode('utf-8') for k in keys]
+
+    def count(self) -> int:
+        return self._db.scard(self._keys_list_key)
+
+    def exists(self, key: str) -> bool:
+        return bool(self._db.sismember(self._keys_list_key, key))
+
+    def scan_keys(self, cursor: Optional[int], batch_size: int) -> Tuple[Optional[int], List[str]]:
+        cursor, keys = self._db.sscan(self._keys_list_key, cursor or 0, count=batch_size)
+        return cursor or None, [k.decode('utf-8') for k in keys]
+
+
+class RedisHashDbDriver(RedisDbDriver):
+    """
+    Stores each model as a Redis hash with one serialized value per property,
+    so that properties can be updated individually.
+    Arrays are stored in `.npy` format.
+    """
+
+    def _dump_field(self, field: str, value: Primitive) -> bytes:
+        if field in self._array_fields and is_array(value):
+            return array_to_bytes(value)
+        return self._serializer.to_string({field: value})
+
+    def _load_field(self, field: str, value: bytes) -> Primitive:
+        if field in self._array_fields and value[:len(NPY_MAGIC)] == NPY_MAGIC:
+            return array_from_bytes(value)
+        return self._serializer.from_string(value)[field]
+
+    def _dump_fields(self, data: ModelDict) -> Dict[str, bytes]:
+        return {k: self._dump_field(k, v) for k, v in data.items()}
+
+    def _load_fields(self, data: Dict[bytes, bytes]) -> ModelDict:
+        res = {}
+        for k, v in data.items():
+            k = k.decode('utf-8')
+            res[k] = self._load_field(k, v)
+
+        return res
+
+    def _load(self, data: Dict[bytes, bytes], exists: bool, appended: List[bytes]) -> Optional[ModelDict]:
+        if data:
+            res = self._load_fields(data)
+        elif exists:
+            # A model with only default values has an empty hash, which Redis does not keep
+            res = {}
+        else:
+            res = None
+
+        return merge_appended(res, self._load_appended(appended))
+
+    def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        pipe = self._db.pipeline(transaction=False)
+        for k in key:
+            pipe.hgetall(k)
+            pipe.sismember(self._keys_list_key, k)
+            pipe.lrange(self._append_key(k), 0, -1)
+        res = pipe.execute()
+        return [self._load(*res[3 * i:3 * i + 3]) for i in range(len(key))]
+
+    def mload_fields(self, key: List[str], fields: List[str]) -> List[Optional[ModelDict]]:
+        pipe = self._db.pipeline(transaction=False)
+        for k in key:
+            pipe.hmget(k, fields)
+            pipe.sismember(self._keys_list_key, k)
+            pipe.lrange(self._append_key(k), 0, -1)
+        res = pipe.execute()
+        loaded = []
+        for i in range(len(key)):
+            values, exists, appended = res[3 * i:3 * i + 3]
+            data = {f: v for f, v in zip(fields, values) if v is not None}
+            if data:
+                data = {k: self._load_field(k, v) for k, v in data.items()}
+            elif exists:
+                data = {}
+            else:
+                data = None
+            appended = [filter_fields(a, fields) for a in self._load_appended(appended)]
+            loaded.append(merge_appended(data, [a for a in appended if a]))
+
+        return loaded
+
+    def _save(self, pipe: 'redis.client.Pipeline', key: str, data: ModelDict):
+        pipe.delete(key, self._append_key(key))
+        if data:
+            pipe.hset(key, mapping=self._dump_fields(data))
+
+    def msave_dict(self, key: List[str], data: List[ModelDict]):
+        with write_pipeline(self._db) as pipe:
+            pipe.sadd(self._keys_list_key, *key)
+            for k, d in zip(key, data):
+                self._save(pipe, k, d)
+
+    def save_dict(self, key: str, data: ModelDict):
+        self.msave_dict([key], [data])
+
+    def _update(self, pipe: 'redis.client.Pipeline', key: str, data: ModelDict, unset: List[str]):
+        if data:
+            pipe.hset(key, mapping=self._dump_fields(data))
+        if unset:
+            pipe.hdel(key, *unset)
+
+    def _fold_appended(self, key: List[str], data: List[ModelDict],
+                       unset: List[List[str]]) -> List[Tuple[ModelDict, bool]]:
+        """
+        Fold values appended to properties into the updates.
+        The appended values and the properties they extend are read in a round trip each.
+        """
+        reader = self._db.pipeline(transaction=False)
+        for k in key:
+            reader.lrange(self._append_key(k), 0, -1)
+        appended = [self._load_appended(a) for a in reader.execute()]
+        fields = [list({f for s in a for f in s}) for a in appended]
+        current = []
+        if any(fields):
+            reader = self._db.pipeline(transaction=False)
+            for k, f in zip(key, fields):
+                if f:
+                    reader.hmget(k, f)
+            current = reader.execute()
+        current = iter(current)
+
+        res = []
+        for d, u, a, f in zip(data, unset, appended, fields):
+            values = {}
+            if a:
+                values = {k: self._load_field(k, v) for k, v in zip(f, next(current)) if v is not None}
+                values = merge_appended(values, a)
+            values.update(d)
+            for k in u:
+                values.pop(k, None)
+            res.append((values, bool(a)))
+
+        return res
+
+    def _queue_update(self, pipe: 'redis.client.Pipeline', key: str, data: ModelDict, unset: List[str],
+                      has_appended: bool):
+        pipe.sadd(self._keys_list_key, key)
+        self._update(pipe, key, data, unset)
+        if has_appended:
+            pipe.delete(self._append_key(key))
+
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        self.mupdate_fields([key], [data], [unset])
+
+    def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        pipe = active_pipeline(self._db)
+        if pipe is not None:
+            # Appended values are read outside the active pipeline, so this update is not atomic
+            for k, u, (values, has_appended) in zip(key, unset, self._fold_appended(key, data, unset)):
+                self._queue_update(pipe, k, values, u, has_appended)
+            return
+
+        def _update(pipe: 'redis.client.Pipeline'):
+            folded = self._fold_appended(key, data, unset)
+            pipe.multi()
+            for k, u, (values, has_appended) in zip(key, unset, folded):
+                self._queue_update(pipe, k, values, u, has_appended)
+
+        # Retried if values are appended while the updates are prepared
+        self._db.transaction(_update, *[self._append_key(k) for k in key])
+
+
+class AsyncRedisDbDriver(AsyncDbDriver):
+    """
+    Redis driver for the `asyncio` API, using a `redis.asyncio.Redis` client.
+    It uses the same layout as `RedisDbDriver`.
+    """
+
+    def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], db: 'redis.asyncio.Redis'):
+        super().__init__(serializer, model_cls)
+        self._db = db
+
+    @property
+    def _keys_list_key(self):
+        return f'_keys:{self.model_name}'
+
+    _append_key = staticmethod(RedisDbDriver._append_key)
+    _arrays_key = staticmethod(RedisDbDriver._arrays_key)
+    _load_appended = RedisDbDriver._load_appended
+    _load_arrays = staticmethod(RedisDbDriver._load_arrays)
+    _queue_arrays = RedisDbDriver._queue_arrays
+
+    async def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        pipe = self._db.pipeline(transaction=False)
+        pipe.mget(key)
+        for k in key:
+            pipe.lrange(self._append_key(k), 0, -1)
+        if self._array_fields:
+            for k in key:
+                pipe.hgetall(self._arrays_key(k))
+        data, *res = await pipe.execute()
+        loaded = [merge_appended(self._serializer.from_string(d), self._load_appended(a))
+                  for d, a in zip(data, res)]
+        if self._array_fields:
+            loaded = [self._load_arrays(d, a) for d, a in zip(loaded, res[len(key):])]
+        return loaded
+
+    async def load_dict(self, key: str) -> Optional[ModelDict]:
+        return (await self.mload_dict([key]))[0]
+
+    async def msave_dict(self, key: List[str], data: List[ModelDict]):
+        pipe = self._db.pipeline()
+        if self._array_fields:
+            data = [self._queue_arrays(pipe, k, d, [], True) for k, d in zip(key, data)]
+        pipe.sadd(self._keys_list_key, *key)
+        pipe.mset({k: self._serializer.to_string(d) for k, d in zip(key, data)})
+        pipe.delete(*[self._append_key(k) for k in key])
+        await pipe.execute()
+
+    async def save_dict(self, key: str, data: ModelDict):
+        await self.msave_dict([key], [data])
+
+    async def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        append_key = self._append_key(key)
+
+        async def _update(pipe: 'redis.asyncio.client.Pipeline'):
+            current = self._serializer.from_string(await pipe.get(key))
+            current = merge_appended(current, self._load_appended(await pipe.lrange(append_key, 0, -1)))
+            if current is None:
+                current = {}
+            current.update(split_arrays(data, self._array_fields)[0])
+            for k in unset:
+                current.pop(k, None)
+            pipe.multi()
+            if self._array_fields:
+                self._queue_arrays(pipe, key, data, unset, False)
+            pipe.sadd(self._keys_list_key, key)
+            pipe.set(key, self._serializer.to_string(current))
+            pipe.delete(append_key)
+
+        await self._db.transaction(_update, key, append_key)
+
+    async def append_list(self, key: str, field: str, values: List[Primitive]):
+        pipe = self._db.pipeline()
+        pipe.sadd(self._keys_list_key, key)
+        pipe.rpush(self._append_key(key), self._serializer.to_string({field: values}))
+        await pipe.execute()
+
+    async def delete(self, key: str):
+        await self.mdelete_dict([key])
+
+    async def mdelete_dict(self, key: List[str]):
+        if not key:
+            return
+        pipe = self._db.pipeline()
+        pipe.srem(self._keys_list_key, *key)
+        pipe.delete(*key, *[self._append_key(k) for k in key])
+        if self._array_fields:
+            pipe.delete(*[self._arrays_key(k) for k in key])
+        await pipe.execute()
+
+    async def get_all(self) -> List[str]:
+        keys = await self._db.smembers(self._keys_list_key)
+        return [k.decode('utf-8') for k in keys]
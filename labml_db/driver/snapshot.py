@@ -0,0 +1,186 @@
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import List, Type, TYPE_CHECKING, Optional, Any, Tuple
+
+from . import DbDriver
+from ..types import ModelDict, Primitive
+
+if TYPE_CHECKING:
+    from .. import Serializer
+    from ..model import Model
+
+_MAGIC = b'LDBSNAP1'
+# magic, number of records, offset of the key table
+_HEADER = struct.Struct('<8sQQ')
+# key offset, key length, value offset, value length
+_ENTRY = struct.Struct('<QIQQ')
+
+# Out-of-band buffers of mappable serializers are aligned relative to the record
+_MAPPABLE_ALIGNMENT = 64
+
+
+def export_snapshot(driver: DbDriver, path: Path, serializer: Optional['Serializer'] = None,
+                    batch_size: int = 1000):
+    """
+    Write all records of `driver` to a snapshot file for `SnapshotDbDriver`.
+    Records are serialized with `serializer`, or the driver's own serializer;
+    drivers without one (Mongo) need `serializer`.
+
+    The file is written to a temporary file and renamed,
+    so drivers that have the old snapshot open keep reading it.
+    """
+    if serializer is None:
+        serializer = driver._serializer
+    if serializer is None:
+        raise ValueError(f'{type(driver).__name__} has no serializer; pass `serializer` to export a snapshot')
+    alignment = _MAPPABLE_ALIGNMENT if serializer.is_mappable else 1
+
+    keys = []
+    for _, batch in driver.iter_key_batches(batch_size):
+        keys += batch
+    keys.sort()
+
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    entries = []
+    with open(str(tmp), 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, 0, 0))
+        offset = _HEADER.size
+        for i in range(0, len(keys), batch_size):
+            batch = keys[i:i + batch_size]
+            for k, d in zip(batch, driver.mload_dict(batch)):
+                if d is None:
+                    continue
+                k = k.encode('utf-8')
+                value = serializer.to_string(d)
+                if isinstance(value, str):
+                    value = value.encode('utf-8')
+                padding = -(offset + len(k)) % alignment
+                f.write(k)
+                f.write(b'\x00' * padding)
+                f.write(value)
+                entries.append((offset, len(k), offset + len(k) + padding, len(value)))
+                offset += len(k) + padding + len(value)
+
+        f.write(b''.join(_ENTRY.pack(*e) for e in entries))
+        f.seek(0)
+        f.write(_HEADER.pack(_MAGIC, len(entries), offset))
+    os.replace(str(tmp), str(path))
+
+
+class _Keys:
+    """
+    Sequence of the sorted keys in the key table, for `bisect`
+    """
+
+    def __init__(self, driver: 'SnapshotDbDriver'):
+        self._driver = driver
+
+    def __len__(self):
+        return self._driver._count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self._driver._key(i)
+
+
+class SnapshotDbDriver(DbDriver):
+    """
+    Read-only driver that serves records from a snapshot file written by `export_snapshot`.
+
+    The file is memory-mapped, and keys are looked up with a binary search of
+    the sorted key table, so opening is constant time and processes
+    reading the same snapshot share it through the page cache.
+    Writes raise `RuntimeError`.
+    """
+
+    def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], path: Path):
+        super().__init__(serializer, model_cls)
+        self._path = path
+        with open(str(path), 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, self._count, self._table = _HEADER.unpack_from(self._view)
+        if magic != _MAGIC:
+            raise ValueError(f'{path} is not a snapshot')
+        self._keys = _Keys(self)
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._view, self._table + i * _ENTRY.size)
+
+    def _key(self, i: int) -> bytes:
+        key_offset, key_length, _, _ = self._entry(i)
+        return self._mmap[key_offset:key_offset + key_length]
+
+    def _find(self, key: str) -> Optional[int]:
+        key = key.encode('utf-8')
+        i = bisect_left(self._keys, key)
+        if i < self._count and self._key(i) == key:
+            return i
+        return None
+
+    def _value(self, i: int) -> ModelDict:
+        _, _, offset, length = self._entry(i)
+        if self._serializer.is_mappable:
+            return self._serializer.from_string(self._view[offset:offset + length])
+        value = self._mmap[offset:offset + length]
+        if not self._serializer.is_bytes:
+            value = value.decode('utf-8')
+        return self._serializer.from_string(value)
+
+    def load_dict(self, key: str) -> Optional[ModelDict]:
+        i = self._find(key)
+        if i is None:
+            return None
+        return self._value(i)
+
+    def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        return [self.load_dict(k) for k in key]
+
+    def get_all(self) -> List[str]:
+        return [self._key(i).decode('utf-8') for i in range(self._count)]
+
+    def count(self) -> int:
+        return self._count
+
+    def exists(self, key: str) -> bool:
+        return self._find(key) is not None
+
+    def scan_keys(self, cursor: Optional[Any], batch_size: int) -> Tuple[Optional[Any], List[str]]:
+        start = cursor or 0
+        end = min(start + batch_size, self._count)
+        keys = [self._key(i).decode('utf-8') for i in range(start, end)]
+        if end == self._count:
+            return None, keys
+        return end, keys
+
+    def _read_only(self):
+        raise RuntimeError(f'Snapshot {self._path} is read-only')
+
+    def delete(self, key: str):
+        self._read_only()
+
+    def mdelete_dict(self, key: List[str]):
+        self._read_only()
+
+    def save_dict(self, key: str, data: ModelDict):
+        self._read_only()
+
+    def msave_dict(self, key: List[str], data: List[ModelDict]):
+        self._read_only()
+
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        self._read_only()
+
+    def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        self._read_only()
+
+    def append_list(self, key: str, field: str, values: List[Primitive]):
+        self._read_only()
+
+    def mappend_list(self, key: List[str], field: str, values: List[List[Primitive]]):
+        self._read_only()
@@ -0,0 +1,191 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Type, TYPE_CHECKING, Optional, Any, Tuple, Iterator
+
+from . import DbDriver
+from ..types import ModelDict, Primitive
+
+if TYPE_CHECKING:
+    from .. import Serializer
+    from ..model import Model
+
+# Below the default limit of 999 host parameters in older SQLite builds
+MAX_PARAMETERS = 900
+
+_SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def chunks(values: List[Any], size: int = MAX_PARAMETERS) -> Iterator[List[Any]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SqliteDatabase:
+    """
+    An SQLite database file in WAL mode, shared by model and index drivers.
+
+    Each thread gets its own connection, so readers in different threads (or processes)
+    don't block each other or the writer. `synchronous` sets `PRAGMA synchronous`;
+    `NORMAL` is durable against application crashes but may lose the last
+    transactions on power loss, `FULL` syncs on every commit.
+    """
+
+    def __init__(self, path: Path, synchronous: str = 'NORMAL', timeout: float = 30.):
+        synchronous = synchronous.upper()
+        if synchronous not in _SYNCHRONOUS:
+            raise ValueError(f'Unknown synchronous level {synchronous}')
+        if not path.parent.exists():
+            path.parent.mkdir(parents=True)
+        self._path = path
+        self._synchronous = synchronous
+        self._timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+        # WAL mode is persistent and can't be set within a transaction
+        self.connection().execute('PRAGMA journal_mode=WAL')
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+
+        # Transactions are managed explicitly by `transaction`.
+        # Connections are only used by their own thread, but `close` may run on another one.
+        conn = sqlite3.connect(str(self._path), timeout=self._timeout, isolation_level=None,
+                               check_same_thread=False)
+        conn.execute(f'PRAGMA synchronous={self._synchronous}')
+        self._local.conn = conn
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run the block in a write transaction, committed on exit and rolled back on error.
+        Nested blocks join the outer transaction.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def create_table(self, name: str, columns: str):
+        with self.transaction() as conn:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {quote(name)} ({columns}) WITHOUT ROWID')
+
+    def close(self):
+        """
+        Close the connections of all threads
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+class SqliteDbDriver(DbDriver):
+    """
+    Stores serialized records in a `(key, value)` table named after the model
+    """
+
+    def __init__(self, serializer: 'Serializer', model_cls: Type['Model'], db: SqliteDatabase):
+        super().__init__(serializer, model_cls)
+        self._db = db
+        self._table = quote(self.model_name)
+        db.create_table(self.model_name, 'key TEXT PRIMARY KEY, value BLOB NOT NULL')
+
+    def _execute(self, sql: str, params: Tuple = ()) -> sqlite3.Cursor:
+        return self._db.connection().execute(sql, params)
+
+    def load_dict(self, key: str) -> Optional[ModelDict]:
+        row = self._execute(f'SELECT value FROM {self._table} WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return self._serializer.from_string(row[0])
+
+    def mload_dict(self, key: List[str]) -> List[Optional[ModelDict]]:
+        values = {}
+        for part in chunks(list(dict.fromkeys(key))):
+            sql = f'SELECT key, value FROM {self._table} WHERE key IN ({",".join("?" * len(part))})'
+            values.update(self._execute(sql, tuple(part)).fetchall())
+
+        res = []
+        for k in key:
+            v = values.get(k, None)
+            res.append(None if v is None else self._serializer.from_string(v))
+        return res
+
+    def delete(self, key: str):
+        with self._db.transaction() as conn:
+            conn.execute(f'DELETE FROM {self._table} WHERE key = ?', (key,))
+
+    def mdelete_dict(self, key: List[str]):
+        with self._db.transaction() as conn:
+            for part in chunks(key):
+                conn.execute(f'DELETE FROM {self._table} WHERE key IN ({",".join("?" * len(part))})', tuple(part))
+
+    def save_dict(self, key: str, data: ModelDict):
+        self.msave_dict([key], [data])
+
+    def msave_dict(self, key: List[str], data: List[ModelDict]):
+        rows = [(k, self._serializer.to_string(d)) for k, d in zip(key, data)]
+        with self._db.transaction() as conn:
+            conn.executemany(f'INSERT OR REPLACE INTO {self._table} (key, value) VALUES (?, ?)', rows)
+
+    def update_fields(self, key: str, data: ModelDict, unset: List[str]):
+        with self._db.transaction():
+            super().update_fields(key, data, unset)
+
+    def mupdate_fields(self, key: List[str], data: List[ModelDict], unset: List[List[str]]):
+        with self._db.transaction():
+            super().mupdate_fields(key, data, unset)
+
+    def append_list(self, key: str, field: str, values: List[Primitive]):
+        with self._db.transaction():
+            super().append_list(key, field, values)
+
+    def mappend_list(self, key: List[str], field: str, values: List[List[Primitive]]):
+        with self._db.transaction():
+            super().mappend_list(key, field, values)
+
+    def get_all(self) -> List[str]:
+        return [r[0] for r in self._execute(f'SELECT key FROM {self._table} ORDER BY key')]
+
+    def count(self) -> int:
+        return self._execute(f'SELECT COUNT(*) FROM {self._table}').fetchone()[0]
+
+    def exists(self, key: str) -> bool:
+        return self._execute(f'SELECT 1 FROM {self._table} WHERE key = ?', (key,)).fetchone() is not None
+
+    def scan_keys(self, cursor: Optional[Any], batch_size: int) -> Tuple[Optional[Any], List[str]]:
+        """
+        The cursor is the last key returned, so batches stay consistent when records
+        are added or removed between calls
+        """
+        if cursor is None:
+            rows = self._execute(f'SELECT key FROM {self._table} ORDER BY key LIMIT ?', (batch_size,))
+        else:
+            rows = self._execute(f'SELECT key FROM {self._table} WHERE key > ? ORDER BY key LIMIT ?',
+                                 (cursor, batch_size))
+        keys = [r[0] for r in rows]
+        if len(keys) < batch_size:
+            return None, keys
+        return keys[-1], keys
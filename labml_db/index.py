@@ -1,6 +1,8 @@
 from typing import Generic, List, Dict, Optional, TypeVar
 
-from .index_driver import IndexDbDriver
+from .index_driver import IndexDbDriver, AsyncIndexDbDriver
+from .loader import BatchLoader
+from .session import current_session
 from .model import Key
 
 _KT = TypeVar('_KT')
@@ -8,6 +10,9 @@ _KT = TypeVar('_KT')
 
 class Index(Generic[_KT]):
     __db_drivers: Dict[str, IndexDbDriver]
+    __async_db_drivers: Dict[str, AsyncIndexDbDriver] = {}
+    __batch_window: Optional[float] = None
+    __loaders: Dict[str, BatchLoader[Optional[str]]] = {}
 
     @staticmethod
     def set_db_drivers(db_drivers: List[IndexDbDriver]):
@@ -15,9 +20,22 @@ class Index(Generic[_KT]):
 
     @classmethod
     def delete(cls, index_key: str):
+        session = current_session()
+        if session is not None:
+            return session.index_delete(cls, index_key)
         db_driver = Index.__db_drivers[cls.__name__]
         db_driver.delete(index_key)
 
+    @classmethod
+    def mdelete(cls, index_key: List[str]):
+        session = current_session()
+        if session is not None:
+            for k in index_key:
+                session.index_delete(cls, k)
+            return
+        db_driver = Index.__db_drivers[cls.__name__]
+        db_driver.mdelete(index_key)
+
     @staticmethod
     def _to_key(key: str):
         if key is None:
@@ -39,9 +57,22 @@ class Index(Generic[_KT]):
 
     @classmethod
     def set(cls, index_key: str, model_key: Key[_KT]):
+        session = current_session()
+        if session is not None:
+            return session.index_set(cls, index_key, str(model_key))
         db_driver = Index.__db_drivers[cls.__name__]
         db_driver.set(index_key, str(model_key))
 
+    @classmethod
+    def mset(cls, data: Dict[str, Key[_KT]]):
+        session = current_session()
+        if session is not None:
+            for k, v in data.items():
+                session.index_set(cls, k, str(v))
+            return
+        db_driver = Index.__db_drivers[cls.__name__]
+        db_driver.mset({k: str(v) for k, v in data.items()})
+
     @classmethod
     def get_all(cls):
         db_driver = Index.__db_drivers[cls.__name__]
@@ -53,3 +84,55 @@ class Index(Generic[_KT]):
         db_driver = Index.__db_drivers[cls.__name__]
         res = db_driver.get_all_key_values()
         return {k: Index._to_key(v) for k, v in res.items()}
+
+    @staticmethod
+    def set_async_db_drivers(db_drivers: List[AsyncIndexDbDriver]):
+        Index.__async_db_drivers = {d.index_name: d for d in db_drivers}
+
+    @classmethod
+    async def adelete(cls, index_key: str):
+        db_driver = Index.__async_db_drivers[cls.__name__]
+        await db_driver.delete(index_key)
+
+    @staticmethod
+    def set_batch_loading(window: Optional[float] = 0.):
+        """
+        Batch `aget` calls on an index made within one event loop iteration (or `window` seconds)
+        into a single `mget`. Pass `None` to disable batching.
+        """
+        Index.__batch_window = window
+        Index.__loaders = {}
+
+    @classmethod
+    async def aget(cls, index_key: str) -> Optional[Key[_KT]]:
+        db_driver = Index.__async_db_drivers[cls.__name__]
+        if Index.__batch_window is None:
+            return Index._to_key(await db_driver.get(index_key))
+
+        loader = Index.__loaders.get(cls.__name__, None)
+        if loader is None:
+            loader = Index.__loaders[cls.__name__] = BatchLoader(db_driver.mget, Index.__batch_window)
+        return Index._to_key(await loader.load(index_key))
+
+    @classmethod
+    async def amget(cls, index_key: List[str]) -> List[Optional[Key[_KT]]]:
+        if not index_key:
+            return []
+        db_driver = Index.__async_db_drivers[cls.__name__]
+        return [Index._to_key(k) for k in await db_driver.mget(index_key)]
+
+    @classmethod
+    async def aset(cls, index_key: str, model_key: Key[_KT]):
+        db_driver = Index.__async_db_drivers[cls.__name__]
+        await db_driver.set(index_key, str(model_key))
+
+    @classmethod
+    async def aget_all(cls):
+        db_driver = Index.__async_db_drivers[cls.__name__]
+        return await db_driver.get_all()
+
+    @classmethod
+    async def aget_all_key_values(cls) -> Dict[str, Key[_KT]]:
+        db_driver = Index.__async_db_drivers[cls.__name__]
+        res = await db_driver.get_all_key_values()
+        return {k: Index._to_key(v) for k, v in res.items()}
@@ -20,8 +20,43 @@ class IndexDbDriver:
     def set(self, index_key: str, model_key: str):
         raise NotImplementedError
 
+    def mset(self, data: Dict[str, str]):
+        for k, v in data.items():
+            self.set(k, v)
+
+    def mdelete(self, index_key: List[str]):
+        for k in index_key:
+            self.delete(k)
+
     def get_all(self) -> List[str]:
         raise NotImplementedError
 
     def get_all_key_values(self) -> Dict[str, str]:
         raise NotImplementedError
+
+
+class AsyncIndexDbDriver:
+    """
+    Base class for index drivers used by the `asyncio` API (`Index.aget`, `Index.aset`, ...)
+    """
+
+    def __init__(self, index_cls: Type['Index']):
+        self.index_name = index_cls.__name__
+
+    async def delete(self, index_key: str):
+        raise NotImplementedError
+
+    async def get(self, index_key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def mget(self, index_key: List[str]) -> List[Optional[str]]:
+        raise NotImplementedError
+
+    async def set(self, index_key: str, model_key: str):
+        raise NotImplementedError
+
+    async def get_all(self) -> List[str]:
+        raise NotImplementedError
+
+    async def get_all_key_values(self) -> Dict[str, str]:
+        raise NotImplementedError
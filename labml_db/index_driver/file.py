@@ -1,53 +1,196 @@
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Type, Optional, TYPE_CHECKING, List
+from typing import Dict, Type, Optional, TYPE_CHECKING, List, Tuple
 
-from . import IndexDbDriver
+from . import IndexDbDriver, AsyncIndexDbDriver
 
 if TYPE_CHECKING:
+    from concurrent.futures import Executor
     from .. import Index
     from .. import Serializer
 
 
 class FileIndexDbDriver(IndexDbDriver):
+    """
+    The index is kept in `index_path`, written with the serializer, and changes are appended
+    to a journal next to it (`<index_path>.journal`) as JSON lines, so a change doesn't
+    rewrite the whole index. The journal is folded into the index file once it has more than
+    `compact_entries` entries and more entries than the index.
+
+    Each operation checks the index file and the journal size, so changes made by other
+    processes are seen; only the new part of the journal is read.
+    The journal is locked with `flock` while it's read or written.
+    """
     _cache: Optional[Dict[str, str]]
 
-    def __init__(self, serializer: 'Serializer', index_cls: Type['Index'], index_path: Path):
+    def __init__(self, serializer: 'Serializer', index_cls: Type['Index'], index_path: Path,
+                 compact_entries: int = 1000):
         super().__init__(index_cls)
         self._serializer = serializer
         self._index_path = index_path
-        self._cache = None
+        self._compact_entries = compact_entries
         if not index_path.parent.exists():
             index_path.parent.mkdir(parents=True)
+        self._journal_path = index_path.with_name(f'{index_path.name}.journal')
+        self._journal = os.open(str(self._journal_path), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._lock = threading.RLock()
+        self._cache = None
+        self._index_stat = None
+        self._offset = 0
+        self._entries = 0
 
-    def _load_cache(self):
-        if self._cache is not None:
-            return
+    @contextmanager
+    def _locked(self, operation: int):
+        with self._lock:
+            fcntl.flock(self._journal, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._journal, fcntl.LOCK_UN)
 
+    def _stat_index(self) -> Optional[Tuple[int, int, int]]:
         try:
-            with open(str(self._index_path), 'r') as f:
-                self._cache = self._serializer.from_string(f.read())
+            s = os.stat(str(self._index_path))
         except FileNotFoundError:
-            self._cache = {}
+            return None
+        return s.st_ino, s.st_mtime_ns, s.st_size
+
+    def _load_cache(self):
+        """
+        Bring the cache up to date; called with the journal locked
+        """
+        index_stat = self._stat_index()
+        size = os.fstat(self._journal).st_size
+        if self._cache is None or index_stat != self._index_stat or size < self._offset:
+            # The index was compacted
+            if index_stat is None:
+                self._cache = {}
+            else:
+                with open(str(self._index_path), 'rb' if self._serializer.is_bytes else 'r') as f:
+                    self._cache = self._serializer.from_string(f.read())
+            self._index_stat = index_stat
+            self._offset = 0
+            self._entries = 0
+
+        if size > self._offset:
+            self._replay(os.pread(self._journal, size - self._offset, self._offset))
 
-    def _save_cache(self):
-        with open(str(self._index_path), 'w') as f:
+    def _replay(self, data: bytes):
+        # A partly written last line is read once it's complete
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                k, v = json.loads(line)
+            except ValueError:
+                # Left by a crashed write
+                continue
+            if v is None:
+                self._cache.pop(k, None)
+            else:
+                self._cache[k] = v
+            self._entries += 1
+        self._offset += end
+
+    def _write(self, data: Dict[str, Optional[str]]):
+        """
+        Append changes to the journal; a value of `None` deletes the key
+        """
+        with self._locked(fcntl.LOCK_EX):
+            self._load_cache()
+            lines = ''.join(json.dumps([k, v]) + '\n' for k, v in data.items())
+            if os.fstat(self._journal).st_size > self._offset:
+                # End the partial line of a crashed write
+                lines = '\n' + lines
+            os.write(self._journal, lines.encode('utf-8'))
+            self._load_cache()
+
+            if self._entries > max(self._compact_entries, len(self._cache)):
+                self._compact()
+
+    def _compact(self):
+        tmp = self._index_path.with_name(f'{self._index_path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(str(tmp), 'wb' if self._serializer.is_bytes else 'w') as f:
             f.write(self._serializer.to_string(self._cache))
+        os.replace(str(tmp), str(self._index_path))
+        os.ftruncate(self._journal, 0)
+        self._index_stat = self._stat_index()
+        self._offset = 0
+        self._entries = 0
+
+    def compact(self):
+        """
+        Fold the journal into the index file
+        """
+        with self._locked(fcntl.LOCK_EX):
+            self._load_cache()
+            self._compact()
 
     def delete(self, index_key: str):
-        self._load_cache()
-        if index_key in self._cache:
-            del self._cache[index_key]
-            self._save_cache()
+        self._write({index_key: None})
 
-    def get(self, index_key: str) -> str:
-        self._load_cache()
-        return self._cache.get(index_key, None)
+    def get(self, index_key: str) -> Optional[str]:
+        with self._locked(fcntl.LOCK_SH):
+            self._load_cache()
+            return self._cache.get(index_key, None)
 
-    def mget(self, index_key: List[str]) -> List[str]:
-        self._load_cache()
-        return [self._cache.get(idx, None) for idx in index_key]
+    def mget(self, index_key: List[str]) -> List[Optional[str]]:
+        with self._locked(fcntl.LOCK_SH):
+            self._load_cache()
+            return [self._cache.get(idx, None) for idx in index_key]
 
     def set(self, index_key: str, model_key: str):
-        self._load_cache()
-        self._cache[index_key] = model_key
-        self._save_cache()
+        self._write({index_key: model_key})
+
+    def mset(self, data: Dict[str, str]):
+        self._write(data)
+
+    def mdelete(self, index_key: List[str]):
+        self._write({k: None for k in index_key})
+
+    def get_all(self) -> List[str]:
+        with self._locked(fcntl.LOCK_SH):
+            self._load_cache()
+            return list(self._cache.values())
+
+    def get_all_key_values(self) -> Dict[str, str]:
+        with self._locked(fcntl.LOCK_SH):
+            self._load_cache()
+            return dict(self._cache)
+
+
+class AsyncFileIndexDbDriver(AsyncIndexDbDriver):
+    """
+    Runs `FileIndexDbDriver` operations on a thread pool so that they don't block the event loop
+    """
+
+    def __init__(self, serializer: 'Serializer', index_cls: Type['Index'], index_path: Path,
+                 executor: Optional['Executor'] = None, compact_entries: int = 1000):
+        super().__init__(index_cls)
+        self._driver = FileIndexDbDriver(serializer, index_cls, index_path, compact_entries)
+        self._executor = executor
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def delete(self, index_key: str):
+        await self._run(self._driver.delete, index_key)
+
+    async def get(self, index_key: str) -> Optional[str]:
+        return await self._run(self._driver.get, index_key)
+
+    async def mget(self, index_key: List[str]) -> List[Optional[str]]:
+        return await self._run(self._driver.mget, index_key)
+
+    async def set(self, index_key: str, model_key: str):
+        await self._run(self._driver.set, index_key, model_key)
+
+    async def get_all(self) -> List[str]:
+        return await self._run(self._driver.get_all)
+
+    async def get_all_key_values(self) -> Dict[str, str]:
+        return await self._run(self._driver.get_all_key_values)
@@ -0,0 +1,278 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, Type, TYPE_CHECKING, List, Optional, Tuple
+
+from . import IndexDbDriver
+
+if TYPE_CHECKING:
+    from .. import Index
+
+_MAGIC = b'LDBHIDX1'
+_HEAP_MAGIC = b'LDBHEAP1'
+# magic, capacity, number of keys, number of deleted slots, unused heap bytes, heap generation
+_HEADER = struct.Struct('<8sQQQQQ')
+# key hash, heap offset of the entry
+_SLOT = struct.Struct('<QQ')
+# key length, value length
+_ENTRY = struct.Struct('<HH')
+
+# Heap offsets are after the heap magic, so these can't be entries
+_EMPTY = 0
+_DELETED = 1
+
+_MAX_LOAD = 0.7
+
+
+def _hash(key: bytes) -> int:
+    # Stable across processes, unlike `hash`
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), 'little')
+
+
+class HashIndexDbDriver(IndexDbDriver):
+    """
+    Index stored on disk as an open-addressing hash table, so it's not loaded into memory.
+
+    The table file (`index_path`) has fixed-size slots with the hash of a key and the offset of
+    its entry in a heap file, which holds keys and values and is only appended to.
+    Both files are memory-mapped, so opening is constant time, `get` reads a few pages,
+    and processes share the pages through the page cache.
+
+    The table is rebuilt into new files when it's more than 70% full, or when more than half the heap
+    is overwritten entries. Operations take an `flock` on `<index_path>.lock`,
+    and check the inode of the table file to remap it after another process rebuilt it.
+    """
+
+    def __init__(self, index_cls: Type['Index'], index_path: Path, capacity: int = 1024):
+        super().__init__(index_cls)
+        self._path = index_path
+        self._min_capacity = 1 << max(capacity - 1, 1).bit_length()
+        if not index_path.parent.exists():
+            index_path.parent.mkdir(parents=True)
+        self._lock = threading.RLock()
+        self._lock_file = open(str(index_path.with_name(f'{index_path.name}.lock')), 'ab')
+        self._ino = None
+        self._table: Optional[mmap.mmap] = None
+        self._heap: Optional[mmap.mmap] = None
+        self._heap_fd = -1
+
+        with self._locked(fcntl.LOCK_EX):
+            pass
+
+    def _heap_path(self, generation: int) -> Path:
+        return self._path.with_name(f'{self._path.name}.{generation}.heap')
+
+    @contextmanager
+    def _locked(self, operation: int):
+        with self._lock:
+            fcntl.flock(self._lock_file, operation)
+            try:
+                self._check(operation == fcntl.LOCK_EX)
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _check(self, writable: bool):
+        try:
+            ino = os.stat(str(self._path)).st_ino
+        except FileNotFoundError:
+            if not writable:
+                # Created by a writer, with the exclusive lock
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            if not self._path.exists():
+                self._write_files(self._min_capacity, [], 0)
+            ino = os.stat(str(self._path)).st_ino
+        if ino != self._ino:
+            self._map()
+
+    def _map(self):
+        self.close()
+        with open(str(self._path), 'r+b') as f:
+            self._table = mmap.mmap(f.fileno(), 0)
+            self._ino = os.fstat(f.fileno()).st_ino
+        magic, self._capacity, _, _, _, generation = _HEADER.unpack_from(self._table)
+        if magic != _MAGIC:
+            raise ValueError(f'{self._path} is not a hash index')
+        self._heap_fd = os.open(str(self._heap_path(generation)), os.O_RDWR | os.O_APPEND)
+        self._map_heap()
+
+    def _map_heap(self):
+        if self._heap is not None:
+            self._heap.close()
+        self._heap = mmap.mmap(self._heap_fd, 0, access=mmap.ACCESS_READ)
+
+    def _entry(self, offset: int) -> Tuple[bytes, bytes]:
+        if offset + _ENTRY.size > len(self._heap):
+            # Appended after the heap was mapped
+            self._map_heap()
+        key_length, value_length = _ENTRY.unpack_from(self._heap, offset)
+        start = offset + _ENTRY.size
+        if start + key_length + value_length > len(self._heap):
+            self._map_heap()
+        return self._heap[start:start + key_length], self._heap[start + key_length:start + key_length + value_length]
+
+    def _slot(self, i: int) -> Tuple[int, int]:
+        return _SLOT.unpack_from(self._table, _HEADER.size + i * _SLOT.size)
+
+    def _set_slot(self, i: int, h: int, offset: int):
+        _SLOT.pack_into(self._table, _HEADER.size + i * _SLOT.size, h, offset)
+
+    def _probe(self, key: bytes, h: int) -> Tuple[Optional[int], int]:
+        """
+        Returns the slot of `key` (or `None`), and the slot to insert it at
+        """
+        mask = self._capacity - 1
+        i = h & mask
+        free = None
+        while True:
+            slot_hash, offset = self._slot(i)
+            if offset == _EMPTY:
+                return None, i if free is None else free
+            if offset == _DELETED:
+                if free is None:
+                    free = i
+            elif slot_hash == h and self._entry(offset)[0] == key:
+                return i, i
+            i = (i + 1) & mask
+
+    def _get(self, index_key: str) -> Optional[str]:
+        key = index_key.encode('utf-8')
+        i, _ = self._probe(key, _hash(key))
+        if i is None:
+            return None
+        return self._entry(self._slot(i)[1])[1].decode('utf-8')
+
+    def _items(self) -> List[Tuple[bytes, bytes]]:
+        table = self._table[_HEADER.size:_HEADER.size + self._capacity * _SLOT.size]
+        return [self._entry(offset) for _, offset in _SLOT.iter_unpack(table) if offset > _DELETED]
+
+    def _write_files(self, capacity: int, items: List[Tuple[bytes, bytes]], generation: int):
+        """
+        Write a new heap and table with `items`, and replace the table file.
+        The heap has a new name so that the current table stays valid until it's replaced.
+        """
+        heap = bytearray(_HEAP_MAGIC)
+        table = bytearray(_HEADER.size + capacity * _SLOT.size)
+        mask = capacity - 1
+        for key, value in items:
+            h = _hash(key)
+            i = h & mask
+            while _SLOT.unpack_from(table, _HEADER.size + i * _SLOT.size)[1] != _EMPTY:
+                i = (i + 1) & mask
+            _SLOT.pack_into(table, _HEADER.size + i * _SLOT.size, h, len(heap))
+            heap += _ENTRY.pack(len(key), len(value)) + key + value
+        _HEADER.pack_into(table, 0, _MAGIC, capacity, len(items), 0, 0, generation)
+
+        with open(str(self._heap_path(generation)), 'wb') as f:
+            f.write(heap)
+        tmp = self._path.with_name(f'{self._path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(str(tmp), 'wb') as f:
+            f.write(table)
+        os.replace(str(tmp), str(self._path))
+
+    def _rebuild(self):
+        items = self._items()
+        capacity = self._min_capacity
+        while len(items) >= capacity * _MAX_LOAD / 2:
+            capacity *= 2
+        generation = _HEADER.unpack_from(self._table)[5]
+        self._write_files(capacity, items, generation + 1)
+        self._map()
+        try:
+            os.unlink(str(self._heap_path(generation)))
+        except FileNotFoundError:
+            pass
+
+    def _write(self, data: Dict[str, Optional[str]]):
+        """
+        Set or delete (if the value is `None`) keys; called with the exclusive lock
+        """
+        _, _, count, deleted, garbage, _ = _HEADER.unpack_from(self._table)
+        heap_size = os.fstat(self._heap_fd).st_size
+        for k, v in data.items():
+            key = k.encode('utf-8')
+            h = _hash(key)
+            i, free = self._probe(key, h)
+            if i is not None:
+                old_key, old_value = self._entry(self._slot(i)[1])
+                garbage += _ENTRY.size + len(old_key) + len(old_value)
+            if v is None:
+                if i is not None:
+                    self._set_slot(i, h, _DELETED)
+                    count -= 1
+                    deleted += 1
+                continue
+
+            value = v.encode('utf-8')
+            os.write(self._heap_fd, _ENTRY.pack(len(key), len(value)) + key + value)
+            if i is None:
+                if self._slot(free)[1] == _DELETED:
+                    deleted -= 1
+                count += 1
+            self._set_slot(free, h, heap_size)
+            heap_size += _ENTRY.size + len(key) + len(value)
+
+            if count + deleted > self._capacity * _MAX_LOAD:
+                self._set_counts(count, deleted, garbage)
+                self._rebuild()
+                _, _, count, deleted, garbage, _ = _HEADER.unpack_from(self._table)
+                heap_size = os.fstat(self._heap_fd).st_size
+
+        self._set_counts(count, deleted, garbage)
+        if garbage > heap_size // 2 and heap_size > 1024 * 1024:
+            self._rebuild()
+
+    def _set_counts(self, count: int, deleted: int, garbage: int):
+        _, capacity, _, _, _, generation = _HEADER.unpack_from(self._table)
+        _HEADER.pack_into(self._table, 0, _MAGIC, capacity, count, deleted, garbage, generation)
+
+    def delete(self, index_key: str):
+        self.mdelete([index_key])
+
+    def get(self, index_key: str) -> Optional[str]:
+        with self._locked(fcntl.LOCK_SH):
+            return self._get(index_key)
+
+    def mget(self, index_key: List[str]) -> List[Optional[str]]:
+        with self._locked(fcntl.LOCK_SH):
+            return [self._get(k) for k in index_key]
+
+    def set(self, index_key: str, model_key: str):
+        self.mset({index_key: model_key})
+
+    def mset(self, data: Dict[str, str]):
+        with self._locked(fcntl.LOCK_EX):
+            self._write(data)
+
+    def mdelete(self, index_key: List[str]):
+        with self._locked(fcntl.LOCK_EX):
+            self._write({k: None for k in index_key})
+
+    def get_all(self) -> List[str]:
+        with self._locked(fcntl.LOCK_SH):
+            return [v.decode('utf-8') for _, v in self._items()]
+
+    def get_all_key_values(self) -> Dict[str, str]:
+        with self._locked(fcntl.LOCK_SH):
+            return {k.decode('utf-8'): v.decode('utf-8') for k, v in self._items()}
+
+    def count(self) -> int:
+        with self._locked(fcntl.LOCK_SH):
+            return _HEADER.unpack_from(self._table)[2]
+
+    def close(self):
+        self._ino = None
+        if self._table is not None:
+            self._table.close()
+            self._table = None
+        if self._heap is not None:
+            self._heap.close()
+            self._heap = None
+        if self._heap_fd != -1:
+            os.close(self._heap_fd)
+            self._heap_fd = -1
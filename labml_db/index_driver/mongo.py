@@ -1,8 +1,9 @@
 from typing import Dict, Type, Optional, TYPE_CHECKING, List
 
-from . import IndexDbDriver
+from . import IndexDbDriver, AsyncIndexDbDriver
 
 if TYPE_CHECKING:
+    import motor.motor_asyncio
     import pymongo
     from .. import Index
 
@@ -36,6 +37,18 @@ class MongoIndexDbDriver(IndexDbDriver):
     def set(self, index_key: str, model_key: str):
         self._index.replace_one({'_id': index_key}, {'_id': index_key, 'value': model_key}, True)
 
+    def mset(self, data: Dict[str, str]):
+        if not data:
+            return
+        from pymongo import ReplaceOne
+        replacements = [ReplaceOne({'_id': k}, {'_id': k, 'value': v}, True) for k, v in data.items()]
+        self._index.bulk_write(replacements, False)
+
+    def mdelete(self, index_key: List[str]):
+        if not index_key:
+            return
+        self._index.delete_many({'_id': {'$in': index_key}})
+
     def get_all(self):
         cur = self._index.find()
         return [d['value'] for d in cur]
@@ -43,3 +56,43 @@ class MongoIndexDbDriver(IndexDbDriver):
     def get_all_key_values(self) -> Dict[str, str]:
         cur = self._index.find()
         return {d['_id']: d['value'] for d in cur}
+
+
+class AsyncMongoIndexDbDriver(AsyncIndexDbDriver):
+    """
+    Mongo index driver for the `asyncio` API, using a `motor` database
+    """
+
+    def __init__(self, index_cls: Type['Index'], db: 'motor.motor_asyncio.AsyncIOMotorDatabase'):
+        super().__init__(index_cls)
+        self._index = db[f'_index_{self.index_name}']
+
+    async def delete(self, index_key: str):
+        await self._index.delete_one({'_id': index_key})
+
+    async def get(self, index_key: str) -> Optional[str]:
+        d = await self._index.find_one({'_id': index_key})
+        if d is None:
+            return None
+        return d['value']
+
+    async def mget(self, index_key: List[str]) -> List[Optional[str]]:
+        cursor = self._index.find({'_id': {'$in': index_key}})
+        res = [None for _ in index_key]
+        idx = {k: i for i, k in enumerate(index_key)}
+        async for d in cursor:
+            i = idx[d['_id']]
+            res[i] = d['value']
+
+        return res
+
+    async def set(self, index_key: str, model_key: str):
+        await self._index.replace_one({'_id': index_key}, {'_id': index_key, 'value': model_key}, True)
+
+    async def get_all(self):
+        cur = self._index.find()
+        return [d['value'] async for d in cur]
+
+    async def get_all_key_values(self) -> Dict[str, str]:
+        cur = self._index.find()
+        return {d['_id']: d['value'] async for d in cur}
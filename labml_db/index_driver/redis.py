@@ -1,9 +1,11 @@
 from typing import Dict, Type, Optional, TYPE_CHECKING, List
 
-from . import IndexDbDriver
+from . import IndexDbDriver, AsyncIndexDbDriver
+from ..driver.redis import write_pipeline
 
 if TYPE_CHECKING:
     import redis
+    import redis.asyncio
     from .. import Index
 
 
@@ -19,7 +21,8 @@ class RedisIndexDbDriver(IndexDbDriver):
         return f'_index:{self.index_name}'
 
     def delete(self, index_key: str):
-        self._db.hdel(self._index_key, index_key)
+        with write_pipeline(self._db) as pipe:
+            pipe.hdel(self._index_key, index_key)
 
     def get(self, index_key: str) -> str:
         return self._db.hget(self._index_key, index_key)
@@ -28,7 +31,49 @@ class RedisIndexDbDriver(IndexDbDriver):
         return self._db.hmget(self._index_key, index_key)
 
     def set(self, index_key: str, model_key: str):
-        self._db.hset(self._index_key, index_key, model_key)
+        with write_pipeline(self._db) as pipe:
+            pipe.hset(self._index_key, index_key, model_key)
+
+    def mset(self, data: Dict[str, str]):
+        if not data:
+            return
+        with write_pipeline(self._db) as pipe:
+            pipe.hset(self._index_key, mapping=data)
+
+    def mdelete(self, index_key: List[str]):
+        if not index_key:
+            return
+        with write_pipeline(self._db) as pipe:
+            pipe.hdel(self._index_key, *index_key)
 
     def get_all(self):
         return self._db.hgetall(self._index_key)
+
+
+class AsyncRedisIndexDbDriver(AsyncIndexDbDriver):
+    """
+    Redis index driver for the `asyncio` API, using a `redis.asyncio.Redis` client
+    """
+
+    def __init__(self, index_cls: Type['Index'], db: 'redis.asyncio.Redis'):
+        super().__init__(index_cls)
+        self._db = db
+
+    @property
+    def _index_key(self):
+        return f'_index:{self.index_name}'
+
+    async def delete(self, index_key: str):
+        await self._db.hdel(self._index_key, index_key)
+
+    async def get(self, index_key: str) -> str:
+        return await self._db.hget(self._index_key, index_key)
+
+    async def mget(self, index_key: List[str]) -> List[str]:
+        return await self._db.hmget(self._index_key, index_key)
+
+    async def set(self, index_key: str, model_key: str):
+        await self._db.hset(self._index_key, index_key, model_key)
+
+    async def get_all(self):
+        return await self._db.hgetall(self._index_key)
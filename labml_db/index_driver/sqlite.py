@@ -0,0 +1,56 @@
+from typing import Dict, Type, TYPE_CHECKING, List, Optional
+
+from . import IndexDbDriver
+from ..driver.sqlite import SqliteDatabase, chunks, quote
+
+if TYPE_CHECKING:
+    from .. import Index
+
+
+class SqliteIndexDbDriver(IndexDbDriver):
+    """
+    Stores the index in an `(index_key, model_key)` table.
+    The table name is prefixed with `_index_` so it doesn't clash with model tables.
+    """
+
+    def __init__(self, index_cls: Type['Index'], db: SqliteDatabase):
+        super().__init__(index_cls)
+        self._db = db
+        self._table = quote(f'_index_{self.index_name}')
+        db.create_table(f'_index_{self.index_name}', 'index_key TEXT PRIMARY KEY, model_key TEXT NOT NULL')
+
+    def delete(self, index_key: str):
+        self.mdelete([index_key])
+
+    def get(self, index_key: str) -> Optional[str]:
+        row = self._db.connection().execute(f'SELECT model_key FROM {self._table} WHERE index_key = ?',
+                                            (index_key,)).fetchone()
+        return None if row is None else row[0]
+
+    def mget(self, index_key: List[str]) -> List[Optional[str]]:
+        conn = self._db.connection()
+        values = {}
+        for part in chunks(list(dict.fromkeys(index_key))):
+            sql = f'SELECT index_key, model_key FROM {self._table} WHERE index_key IN ({",".join("?" * len(part))})'
+            values.update(conn.execute(sql, tuple(part)).fetchall())
+        return [values.get(k, None) for k in index_key]
+
+    def set(self, index_key: str, model_key: str):
+        self.mset({index_key: model_key})
+
+    def mset(self, data: Dict[str, str]):
+        with self._db.transaction() as conn:
+            conn.executemany(f'INSERT OR REPLACE INTO {self._table} (index_key, model_key) VALUES (?, ?)',
+                             data.items())
+
+    def mdelete(self, index_key: List[str]):
+        with self._db.transaction() as conn:
+            for part in chunks(index_key):
+                conn.execute(f'DELETE FROM {self._table} WHERE index_key IN ({",".join("?" * len(part))})',
+                             tuple(part))
+
+    def get_all(self) -> List[str]:
+        return [r[0] for r in self._db.connection().execute(f'SELECT model_key FROM {self._table}')]
+
+    def get_all_key_values(self) -> Dict[str, str]:
+        return dict(self._db.connection().execute(f'SELECT index_key, model_key FROM {self._table}').fetchall())
@@ -0,0 +1,67 @@
+import asyncio
+import weakref
+from typing import Callable, Awaitable, List, Dict, Optional, Generic, TypeVar
+
+_T = TypeVar('_T')
+
+
+class BatchLoader(Generic[_T]):
+    """
+    Collects the keys requested with `load` within one event loop iteration,
+    or within `window` seconds if it is positive, and loads them with
+    a single call to `load_many`.
+
+    Duplicate keys are loaded once; if `copy` is given, every caller after the
+    first gets a copy of the loaded value.
+    """
+
+    def __init__(self, load_many: Callable[[List[str]], Awaitable[List[_T]]], window: float = 0.,
+                 copy: Optional[Callable[[_T], _T]] = None):
+        self.load_many = load_many
+        self.window = window
+        self.copy = copy
+        self._pending: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, List[asyncio.Future]]]' = \
+            weakref.WeakKeyDictionary()
+
+    async def load(self, key: str) -> _T:
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(loop, None)
+        if pending is None:
+            pending = self._pending[loop] = {}
+            if self.window > 0:
+                loop.call_later(self.window, self._dispatch, loop)
+            else:
+                loop.call_soon(self._dispatch, loop)
+
+        future = loop.create_future()
+        if key not in pending:
+            pending[key] = []
+        pending[key].append(future)
+
+        return await future
+
+    def _dispatch(self, loop: asyncio.AbstractEventLoop):
+        pending = self._pending.pop(loop)
+        loop.create_task(self._load(pending))
+
+    async def _load(self, pending: Dict[str, List[asyncio.Future]]):
+        keys = list(pending.keys())
+        try:
+            values = await self.load_many(keys)
+        except BaseException as e:
+            for futures in pending.values():
+                for f in futures:
+                    if not f.done():
+                        f.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        for k, v in zip(keys, values):
+            for i, f in enumerate(pending[k]):
+                if f.done():
+                    continue
+                if i > 0 and self.copy is not None and v is not None:
+                    f.set_result(self.copy(v))
+                else:
+                    f.set_result(v)
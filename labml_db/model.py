@@ -1,12 +1,27 @@
+import asyncio
 import copy
+import sys
+import threading
+import time
 import warnings
-from typing import Generic, Union, Any
-from typing import TypeVar, List, Dict, Type, Set, Optional, _GenericAlias, TYPE_CHECKING
-
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Generic, Union, Any, ForwardRef, get_origin, get_args
+from typing import TypeVar, List, Dict, Type, Set, Optional, Tuple, Iterator, TYPE_CHECKING
+
+from .arrays import is_array_annotation
+from .loader import BatchLoader
+from .session import current_session
 from .types import Primitive, ModelDict
 
+try:
+    from types import UnionType
+except ImportError:
+    UnionType = None
+
 if TYPE_CHECKING:
-    from .driver import DbDriver
+    from .driver import DbDriver, AsyncDbDriver
 
 _KT = TypeVar('_KT')
 
@@ -47,12 +62,17 @@ def _get_base_classes(class_: Type['Model']) -> List[Type['Model']]:
 
 class Key(Generic[_KT]):
     _key: str
+    # Model attached by `Model.prefetch`
+    _model: Optional['Model'] = None
 
     def __init__(self, key: str):
         if type(key) == bytes:
             key = key.decode('utf-8')
         self._key = key
 
+    def __reduce__(self):
+        return Key, (self._key,)
+
     def __str__(self):
         return self._key
 
@@ -62,10 +82,31 @@ class Key(Generic[_KT]):
     def __eq__(self, other: 'Key'):
         return str(self) == str(other)
 
-    def load(self, db_driver: Optional['DbDriver'] = None) -> _KT:
-        return Model.load(self._key, db_driver)
+    def load(self, db_driver: Optional['DbDriver'] = None, prefetch: Optional[List[str]] = None) -> _KT:
+        if self._model is not None and db_driver is None and Model.get_cache() is None:
+            if prefetch:
+                Model.prefetch([self._model], prefetch)
+            return self._model
+        return Model.load(self._key, db_driver, prefetch)
+
+    async def aload(self, db_driver: Optional['AsyncDbDriver'] = None,
+                    prefetch: Optional[List[str]] = None) -> _KT:
+        if self._model is not None and db_driver is None and Model.get_cache() is None:
+            if prefetch:
+                await Model.aprefetch([self._model], prefetch)
+            return self._model
+        return await Model.aload(self._key, db_driver, prefetch)
+
+    async def adelete(self):
+        self._model = None
+        return await Model.adelete_by_key(self._key)
+
+    @property
+    def prefetched(self) -> Optional[_KT]:
+        return self._model
 
     def delete(self):
+        self._model = None
         return Model.delete_by_key(self._key)
 
     def save(self, data: ModelDict):
@@ -99,26 +140,221 @@ class KeyList(Generic[_KT]):
     def __str__(self):
         return ', '.join(self._keys)
 
-    # TODO: Implement these for multiple gets/sets on driver
-    def load(self, db_driver: Optional['DbDriver'] = None) -> List[_KT]:
-        return Model.mload(self._keys, db_driver)
-
-    #
-    # def delete(self):
-    #     return [Model.delete_by_key(k) for k in self._keys]
-    #
-    # def save(self, data: List[ModelDict]):
-    #     assert len(data) == len(self._keys)
-    #     return [Model.save_by_key(k, d) for k, d in zip(self._keys, data)]
-    #
+    def load(self, db_driver: Optional['DbDriver'] = None, prefetch: Optional[List[str]] = None) -> List[_KT]:
+        return Model.mload(self._keys, db_driver, prefetch)
+
+    async def aload(self, db_driver: Optional['AsyncDbDriver'] = None,
+                    prefetch: Optional[List[str]] = None) -> List[_KT]:
+        return await Model.amload(self._keys, db_driver, prefetch)
+
+    def delete(self):
+        return Model.mdelete_by_key(self._keys)
+
+    def save(self, data: List[ModelDict]):
+        assert len(data) == len(self._keys)
+        return Model.msave_by_key(self._keys, data)
+
     def read(self, db_driver: Optional['DbDriver'] = None) -> List[ModelDict]:
-        return [Model.read_dict(k, db_driver) for k in self._keys]
+        return Model.mread_dict(self._keys, db_driver)
 
     def __repr__(self):
         s = ', '.join(self._keys)
         return f'KeyList({s})'
 
 
+_MISSING = object()
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_IMMUTABLE_TYPES = (type(None), bool, int, float, complex, str, bytes, frozenset, Key)
+_UNION_TYPES = (Union, UnionType) if UnionType is not None else (Union,)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool used to load from several drivers concurrently
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix='labml_db')
+        return _executor
+
+
+# Number of elements of a container that `_sizeof` looks at
+_SIZEOF_SAMPLE = 8
+
+
+def _sizeof(value: Any) -> int:
+    """
+    Estimate of the memory used by `value`.
+    The size of the elements of containers is extrapolated from the first few,
+    so that the cost doesn't grow with the size of the value.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        sample = [_sizeof(k) + _sizeof(v) for k, v in islice(value.items(), _SIZEOF_SAMPLE)]
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        sample = [_sizeof(v) for v in islice(value, _SIZEOF_SAMPLE)]
+    else:
+        return size
+
+    if sample:
+        size += sum(sample) * len(value) // len(sample)
+    return size
+
+
+class ModelCache:
+    """
+    A per-process identity map of loaded models.
+
+    Entries are evicted least-recently-used first once there are more than `max_size`
+    models, or once the estimated memory of cached models exceeds `max_memory` bytes.
+    Entries older than `ttl` seconds are treated as misses.
+    """
+
+    def __init__(self, max_size: int = 1024, max_memory: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.max_memory = max_memory
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.memory = 0
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional['Model']:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            model, size, expires = entry
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return model
+
+    def put(self, model: 'Model'):
+        size = _sizeof(model._values) if self.max_memory is not None else 0
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._remove(model._key)
+            self._entries[model._key] = (model, size, expires)
+            self.memory += size
+            while len(self._entries) > self.max_size or (
+                    self.max_memory is not None and self.memory > self.max_memory and len(self._entries) > 1):
+                key, (_, size, _) = self._entries.popitem(last=False)
+                self.memory -= size
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.memory -= entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    size=len(self._entries), memory=self.memory)
+
+
+class _Field:
+    """
+    Data descriptor installed on model classes for each property.
+    Immutable defaults are shared; mutable defaults are copied on first access.
+    Assignments and reads of mutable values mark the property dirty.
+    Properties missing from a model loaded with a projection are loaded on first access.
+    """
+    __slots__ = ('name', 'default', 'is_mutable', 'is_required')
+
+    def __init__(self, name: str, default: Any, is_required: bool):
+        self.name = name
+        self.default = default
+        self.is_required = is_required
+        self.is_mutable = type(default) not in _IMMUTABLE_TYPES
+
+    def __get__(self, instance: Optional['Model'], owner: Type['Model']):
+        if instance is None:
+            return self
+
+        values = instance._values
+        value = values.get(self.name, _MISSING)
+        if value is not _MISSING:
+            # Mutable values can be modified in place, so they are considered dirty once read
+            if type(value) not in _IMMUTABLE_TYPES:
+                instance._dirty.add(self.name)
+            return value
+        projection = instance._projection
+        if projection is not None and self.name not in projection:
+            instance._load_projected()
+            return self.__get__(instance, owner)
+        if self.is_required:
+            # Python then calls `Model.__getattr__`, which raises the error
+            raise AttributeError(self.name)
+        if self.is_mutable:
+            value = values[self.name] = copy.deepcopy(self.default)
+            instance._dirty.add(self.name)
+            return value
+
+        return self.default
+
+    def __set__(self, instance: 'Model', value: Any):
+        instance._values[self.name] = value
+        instance._dirty.add(self.name)
+
+
+def _is_optional(annotation: Any) -> bool:
+    return get_origin(annotation) in _UNION_TYPES and type(None) in get_args(annotation)
+
+
+def _may_hold_key(annotation: Any) -> bool:
+    """
+    Whether a property with this type annotation can contain `Key`s.
+    String and forward-reference annotations (including `from __future__ import annotations`)
+    are not resolved, so they are assumed to.
+    """
+    if annotation is Any or isinstance(annotation, (TypeVar, str, ForwardRef)):
+        return True
+    if isinstance(annotation, type):
+        if issubclass(annotation, Key):
+            return True
+        return annotation in (list, dict, tuple, set, frozenset, object)
+    origin = get_origin(annotation)
+    if origin is Key:
+        return True
+    args = get_args(annotation)
+    if origin in (list, dict, tuple, set, frozenset) and not args:
+        return True
+
+    return any(_may_hold_key(a) for a in args)
+
+
+def _get_keys(value: Any) -> List[Key]:
+    if isinstance(value, Key):
+        return [value]
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple, set)):
+        return []
+
+    return [v for v in value if isinstance(v, Key)]
+
+
 class ModelSpec:
     def __init__(self, model_cls: Type['Model']):
         classes = _get_base_classes(model_cls)
@@ -135,7 +371,11 @@ class ModelSpec:
 
         self.required = set()
         self.nones = set()
+        self.default_values: Dict[str, Primitive] = {}
         self.check_defaults()
+        self.array_fields = {k for k, v in self.annotations.items() if k[0] != '_' and is_array_annotation(v)}
+        self.key_fields = {k for k, v in self.annotations.items()
+                           if k[0] != '_' and k not in self.array_fields and _may_hold_key(v)}
 
     def check_defaults(self):
         defaults = {}
@@ -147,10 +387,9 @@ class ModelSpec:
                 continue
             if k not in defaults:
                 # check for optional
-                if isinstance(v, _GenericAlias):
-                    if v._name is None and type(None) in v.__args__:
-                        defaults[k] = None
-                        self.nones.add(k)
+                if _is_optional(v):
+                    defaults[k] = None
+                    self.nones.add(k)
             if k not in defaults:
                 self.required.add(k)
 
@@ -158,22 +397,45 @@ class ModelSpec:
             if k not in self.annotations:
                 raise ValueError(f'Unknown default {self.model_cls.__name__}:{k} = {defaults[k]}')
 
+        self.default_values = defaults
+
     def defaults(self) -> Dict[str, Primitive]:
-        defaults = {k: None for k in self.nones}
-        for d in self._defaults:
-            defaults.update(d.defaults())
+        return dict(self.default_values)
+
+    def create_fields(self):
+        """
+        Install a `_Field` descriptor on the model class for each property
+        """
+        for k in self.annotations:
+            if k[0] == '_':
+                continue
+            attr = getattr(self.model_cls, k, None)
+            if attr is not None and not isinstance(attr, _Field):
+                continue
+            setattr(self.model_cls, k, _Field(k, self.default_values.get(k, None), k in self.required))
+
 
-        return defaults
+class _ModelMeta(type):
+    """
+    Gives model classes empty `__slots__` unless they declare their own,
+    so that instances keep their state in the slots of `Model` and don't have a `__dict__`
+    """
 
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        namespace.setdefault('__slots__', ())
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
 
-class Model(Generic[_KT]):
+
+class Model(Generic[_KT], metaclass=_ModelMeta):
+    __slots__ = ('_key', '_values', '_dirty', '_projection')
     __models: Dict[str, ModelSpec] = {}
     __db_drivers: Dict[str, 'DbDriver']
-    _defaults = Dict[str, Primitive]
-    _values = Dict[str, Primitive]
+    __async_db_drivers: Dict[str, 'AsyncDbDriver'] = {}
+    __cache: Optional[ModelCache] = None
+    __loader: Optional[BatchLoader[ModelDict]] = None
 
     def __init__(self, key: Optional[str] = None, **kwargs):
-        model_cls: ModelSpec = Model.__models[self.__class__.__name__]
+        model_cls: ModelSpec = self._spec
 
         if key is None:
             key = f'{model_cls.name}:{generate_uuid()}'
@@ -183,7 +445,8 @@ class Model(Generic[_KT]):
 
         self._key = key
         self._values = {}
-        self._defaults = model_cls.defaults()
+        self._dirty = set()
+        self._projection = None
 
         for k in model_cls.required:
             if k not in kwargs:
@@ -196,7 +459,10 @@ class Model(Generic[_KT]):
         if cls.__name__ in Model.__models:
             warnings.warn(f"{cls.__name__} already used")
 
-        Model.__models[cls.__name__] = ModelSpec(cls)
+        spec = ModelSpec(cls)
+        Model.__models[cls.__name__] = spec
+        cls._spec = spec
+        spec.create_fields()
 
     @classmethod
     def get_all(cls) -> List['Key[_KT]']:
@@ -204,16 +470,56 @@ class Model(Generic[_KT]):
         keys = db_driver.get_all()
         return [Key(k) for k in keys]
 
+    @classmethod
+    def count(cls) -> int:
+        db_driver = Model.__db_drivers[cls.__name__]
+        return db_driver.count()
+
+    @staticmethod
+    def exists(key: str) -> bool:
+        model_name = key.split(':')[0]
+        return Model.__db_drivers[model_name].exists(key)
+
+    @classmethod
+    def scan_keys(cls, cursor: Optional[Any] = None, batch_size: int = 1000) -> Tuple[Optional[Any], List['Key[_KT]']]:
+        """
+        Returns a batch of keys and the cursor to fetch the next batch with.
+        Start with `cursor=None`; a returned cursor of `None` means there are no more keys.
+        """
+        db_driver = Model.__db_drivers[cls.__name__]
+        cursor, keys = db_driver.scan_keys(cursor, batch_size)
+        return cursor, [Key(k) for k in keys]
+
+    @classmethod
+    def iter_keys(cls, batch_size: int = 1000, cursor: Optional[Any] = None) -> Iterator['Key[_KT]']:
+        db_driver = Model.__db_drivers[cls.__name__]
+        for _, keys in db_driver.iter_key_batches(batch_size, cursor):
+            for k in keys:
+                yield Key(k)
+
+    @classmethod
+    def iter_all(cls, batch_size: int = 1000, cursor: Optional[Any] = None,
+                 fields: Optional[List[str]] = None) -> Iterator[_KT]:
+        """
+        Iterate over all models, loading `batch_size` models at a time.
+        If `fields` is given only those properties are loaded.
+        """
+        db_driver = Model.__db_drivers[cls.__name__]
+        for _, keys in db_driver.iter_key_batches(batch_size, cursor):
+            for m in cls.mload(keys, fields=fields):
+                if m is not None:
+                    yield m
+
     def __setattr__(self, key: str, value: Primitive):
         if key[0] == '_':
-            self.__dict__[key] = value
+            object.__setattr__(self, key, value)
             return
 
-        model_cls: ModelSpec = Model.__models[self.__class__.__name__]
-        if key not in model_cls.annotations:
+        if key not in self._spec.annotations:
             raise ValueError(f'Unknown property {key}')
 
         self._values[key] = value
+        self._dirty.add(key)
 
     def update(self, data: ModelDict):
         """
@@ -223,14 +529,13 @@ class Model(Generic[_KT]):
             setattr(self, k, v)
 
     def __getattr__(self, key: str):
-        model_cls: ModelSpec = Model.__models[self.__class__.__name__]
-        if key not in model_cls.annotations:
-            raise ValueError(f'Unknown property {key}')
-
-        if key not in self._values:
-            self._values[key] = copy.deepcopy(self._defaults[key])
-
-        return self._values[key]
+        # Properties are served by `_Field` descriptors; this is only reached for unknown names
+        if key[0] == '_':
+            raise AttributeError(key)
+        if key in self._spec.required:
+            # An `AttributeError`, so that `getattr` with a default and `hasattr` work
+            raise AttributeError(f'Missing required value {self.__class__.__name__}:{key}')
+        raise ValueError(f'Unknown property {key}')
 
     @classmethod
     def defaults(cls):
@@ -247,51 +552,373 @@ class Model(Generic[_KT]):
     def set_db_drivers(db_drivers: List['DbDriver']):
         Model.__db_drivers = {d.model_name: d for d in db_drivers}
 
+    @staticmethod
+    def set_cache(cache: Optional[ModelCache]):
+        """
+        Set the identity map used by `load` and `mload`. Pass `None` to disable caching.
+        """
+        Model.__cache = cache
+
+    @staticmethod
+    def get_cache() -> Optional[ModelCache]:
+        return Model.__cache
+
+    @staticmethod
+    def _invalidate(key: str):
+        if Model.__cache is not None:
+            Model.__cache.invalidate(key)
+
+    @staticmethod
+    def _group_keys(key: List[str]) -> Dict[str, List[int]]:
+        """
+        Group the indexes of keys by model name
+        """
+        groups = {}
+        for i, k in enumerate(key):
+            model_name = k.split(':')[0]
+            if model_name not in groups:
+                groups[model_name] = []
+            groups[model_name].append(i)
+
+        return groups
+
     @classmethod
-    def mread_dict(cls, key: List[str], db_driver: Optional['DbDriver'] = None) -> List[ModelDict]:
+    def mread_dict(cls, key: List[str], db_driver: Optional['DbDriver'] = None,
+                   fields: Optional[List[str]] = None) -> List[ModelDict]:
+        """
+        Load the records of `key`. If `fields` is given only those properties are loaded.
+        """
         if not key:
             return []
-        model_name = key[0].split(':')[0]
-        if db_driver is None:
-            db_driver = Model.__db_drivers[model_name]
-        data = db_driver.mload_dict(key)
 
-        return data
+        def _read(driver: 'DbDriver', k: List[str]):
+            if fields is None:
+                return driver.mload_dict(k)
+            return driver.mload_fields(k, fields)
+
+        if db_driver is not None:
+            return _read(db_driver, key)
+
+        groups = Model._group_keys(key)
+        if len(groups) == 1:
+            model_name = next(iter(groups))
+            return _read(Model.__db_drivers[model_name], key)
+
+        def _load(model_name: str, idx: List[int]):
+            return _read(Model.__db_drivers[model_name], [key[i] for i in idx])
+
+        executor = _get_executor()
+        futures = [(idx, executor.submit(_load, n, idx)) for n, idx in groups.items()]
+        res = [None for _ in key]
+        for idx, f in futures:
+            for i, d in zip(idx, f.result()):
+                res[i] = d
+
+        return res
 
     @classmethod
-    def read_dict(cls, key: str, db_driver: Optional['DbDriver'] = None) -> ModelDict:
+    def read_dict(cls, key: str, db_driver: Optional['DbDriver'] = None,
+                  fields: Optional[List[str]] = None) -> ModelDict:
         model_name = key.split(':')[0]
         if db_driver is None:
             db_driver = Model.__db_drivers[model_name]
-        data = db_driver.load_dict(key)
+        if fields is None:
+            data = db_driver.load_dict(key)
+        else:
+            data = db_driver.load_fields(key, fields)
 
         return data
 
     @staticmethod
-    def _to_model(key: str, data: Optional[ModelDict]):
-        return Model.from_dict(key, data) if data is not None else None
+    def _to_model(key: str, data: Optional[ModelDict], cache: bool = True,
+                  fields: Optional[List[str]] = None):
+        if data is None:
+            return None
+        model = Model.from_dict(key, data)
+        if fields is not None:
+            # Partially loaded models are not cached
+            model._projection = frozenset(fields)
+        elif cache and Model.__cache is not None:
+            Model.__cache.put(model)
+        return model
+
+    @staticmethod
+    def _projection_fields(fields: Optional[List[str]], prefetch: Optional[List[str]]) -> Optional[List[str]]:
+        if fields is None or not prefetch:
+            return fields
+        fields = list(fields)
+        for path in prefetch:
+            field = path.split('.')[0]
+            if field not in fields:
+                fields.append(field)
+        return fields
 
     @classmethod
-    def load(cls, key: str, db_driver: Optional['DbDriver'] = None) -> Optional[_KT]:
-        return Model._to_model(key, cls.read_dict(key, db_driver))
+    def load(cls, key: str, db_driver: Optional['DbDriver'] = None,
+             prefetch: Optional[List[str]] = None, fields: Optional[List[str]] = None) -> Optional[_KT]:
+        """
+        Load a model. If `fields` is given only those properties are loaded,
+        and the rest are loaded on first access.
+        """
+        fields = Model._projection_fields(fields, prefetch)
+        model = None
+        if Model.__cache is not None and db_driver is None:
+            model = Model.__cache.get(key)
+        if model is None:
+            model = Model._to_model(key, cls.read_dict(key, db_driver, fields), db_driver is None, fields)
+        if prefetch and model is not None:
+            Model.prefetch([model], prefetch)
+        return model
 
     @classmethod
-    def mload(cls, key: List[str], db_driver: Optional['DbDriver'] = None) -> List[Optional[_KT]]:
-        data = cls.mread_dict(key, db_driver)
-        return [Model._to_model(k, d) for k, d in zip(key, data)]
+    def mload(cls, key: List[str], db_driver: Optional['DbDriver'] = None,
+              prefetch: Optional[List[str]] = None, fields: Optional[List[str]] = None) -> List[Optional[_KT]]:
+        fields = Model._projection_fields(fields, prefetch)
+        if Model.__cache is None or db_driver is not None:
+            data = cls.mread_dict(key, db_driver, fields)
+            res = [Model._to_model(k, d, db_driver is None, fields) for k, d in zip(key, data)]
+        else:
+            res = [Model.__cache.get(k) for k in key]
+            missing = [i for i, m in enumerate(res) if m is None]
+            if missing:
+                data = cls.mread_dict([key[i] for i in missing], fields=fields)
+                for i, d in zip(missing, data):
+                    res[i] = Model._to_model(key[i], d, fields=fields)
+
+        if prefetch:
+            Model.prefetch(res, prefetch)
+        return res
+
+    @staticmethod
+    def _prefetch_level(models: List[Optional['Model']], prefetch: List[str]) -> List[Tuple['Model', Dict]]:
+        tree = {}
+        for path in prefetch:
+            node = tree
+            for field in path.split('.'):
+                node = node.setdefault(field, {})
+
+        return [(m, tree) for m in models if m is not None]
+
+    @staticmethod
+    def _prefetch_refs(level: List[Tuple['Model', Dict]]) -> List[Tuple[Key, Dict]]:
+        refs = []
+        for m, node in level:
+            spec = m._spec
+            for field, child in node.items():
+                if field not in spec.key_fields:
+                    raise ValueError(f'{spec.name}:{field} is not a Key property')
+                value = m._values.get(field, spec.default_values.get(field, None))
+                refs += [(k, child) for k in _get_keys(value)]
+
+        return refs
+
+    @staticmethod
+    def _prefetch_attach(refs: List[Tuple[Key, Dict]], loaded: Dict[str, Optional['Model']]):
+        level = []
+        expanded = set()
+        for k, child in refs:
+            model = loaded[str(k)]
+            if Model.__cache is None:
+                # Keys of cached models outlive the request, and would keep stale models
+                k._model = model
+            if model is not None and child and (str(k), id(child)) not in expanded:
+                expanded.add((str(k), id(child)))
+                level.append((model, child))
+
+        return level
+
+    @staticmethod
+    def prefetch(models: List[Optional['Model']], prefetch: List[str]):
+        """
+        Load the models referenced by `Key` properties and attach them to the keys,
+        so that `Key.load` returns them without going to the driver.
+        With a `ModelCache`, the models are only put in the cache, which is invalidated
+        when they are saved or deleted.
+
+        `prefetch` is a list of property paths such as `['projects', 'projects.owner']`.
+        The references are resolved breadth-first, with one `mload` per level.
+        """
+        level = Model._prefetch_level(models, prefetch)
+        while level:
+            refs = Model._prefetch_refs(level)
+            keys = list({str(k): None for k, _ in refs})
+            level = Model._prefetch_attach(refs, dict(zip(keys, Model.mload(keys))))
 
     @staticmethod
     def delete_by_key(key: str):
+        session = current_session()
+        if session is not None:
+            return session.delete(key)
         model_name = key.split(':')[0]
         db_driver = Model.__db_drivers[model_name]
+        Model._invalidate(key)
         db_driver.delete(key)
 
+    @staticmethod
+    def mdelete_by_key(key: List[str]):
+        session = current_session()
+        if session is not None:
+            for k in key:
+                session.delete(k)
+            return
+        for model_name, idx in Model._group_keys(key).items():
+            keys = [key[i] for i in idx]
+            for k in keys:
+                Model._invalidate(k)
+            Model.__db_drivers[model_name].mdelete_dict(keys)
+
+    @staticmethod
+    def msave_by_key(key: List[str], data: List[ModelDict]):
+        session = current_session()
+        if session is not None:
+            for k, d in zip(key, data):
+                session.save_dict(k, d)
+            return
+        for model_name, idx in Model._group_keys(key).items():
+            keys = [key[i] for i in idx]
+            for k in keys:
+                Model._invalidate(k)
+            Model.__db_drivers[model_name].msave_dict(keys, [data[i] for i in idx])
+
     @staticmethod
     def save_by_key(key: str, data: ModelDict):
+        session = current_session()
+        if session is not None:
+            return session.save_dict(key, data)
         model_name = key.split(':')[0]
         db_driver = Model.__db_drivers[model_name]
+        Model._invalidate(key)
         db_driver.save_dict(key, data)
 
+    @staticmethod
+    def set_async_db_drivers(db_drivers: List['AsyncDbDriver']):
+        Model.__async_db_drivers = {d.model_name: d for d in db_drivers}
+
+    @staticmethod
+    def set_batch_loading(window: Optional[float] = 0.):
+        """
+        Batch `aload` calls made within one event loop iteration (or `window` seconds)
+        into a single `mload_dict` per driver. Pass `None` to disable batching.
+        """
+        if window is None:
+            Model.__loader = None
+        else:
+            Model.__loader = BatchLoader(Model.amread_dict, window, copy.deepcopy)
+
+    @classmethod
+    async def aget_all(cls) -> List['Key[_KT]']:
+        db_driver = Model.__async_db_drivers[cls.__name__]
+        keys = await db_driver.get_all()
+        return [Key(k) for k in keys]
+
+    @classmethod
+    async def amread_dict(cls, key: List[str], db_driver: Optional['AsyncDbDriver'] = None) -> List[ModelDict]:
+        if not key:
+            return []
+        if db_driver is not None:
+            return await db_driver.mload_dict(key)
+
+        groups = list(Model._group_keys(key).items())
+        data = await asyncio.gather(*[Model.__async_db_drivers[n].mload_dict([key[i] for i in idx])
+                                      for n, idx in groups])
+        res = [None for _ in key]
+        for (_, idx), d in zip(groups, data):
+            for i, v in zip(idx, d):
+                res[i] = v
+
+        return res
+
+    @classmethod
+    async def aread_dict(cls, key: str, db_driver: Optional['AsyncDbDriver'] = None) -> ModelDict:
+        model_name = key.split(':')[0]
+        if db_driver is None:
+            db_driver = Model.__async_db_drivers[model_name]
+        return await db_driver.load_dict(key)
+
+    @classmethod
+    async def aload(cls, key: str, db_driver: Optional['AsyncDbDriver'] = None,
+                    prefetch: Optional[List[str]] = None) -> Optional[_KT]:
+        model = None
+        if Model.__cache is not None and db_driver is None:
+            model = Model.__cache.get(key)
+        if model is None:
+            if Model.__loader is not None and db_driver is None:
+                data = await Model.__loader.load(key)
+            else:
+                data = await cls.aread_dict(key, db_driver)
+            model = Model._to_model(key, data, db_driver is None)
+        if prefetch and model is not None:
+            await Model.aprefetch([model], prefetch)
+        return model
+
+    @classmethod
+    async def amload(cls, key: List[str], db_driver: Optional['AsyncDbDriver'] = None,
+                     prefetch: Optional[List[str]] = None) -> List[Optional[_KT]]:
+        if Model.__cache is None or db_driver is not None:
+            data = await cls.amread_dict(key, db_driver)
+            res = [Model._to_model(k, d, db_driver is None) for k, d in zip(key, data)]
+        else:
+            res = [Model.__cache.get(k) for k in key]
+            missing = [i for i, m in enumerate(res) if m is None]
+            if missing:
+                data = await cls.amread_dict([key[i] for i in missing])
+                for i, d in zip(missing, data):
+                    res[i] = Model._to_model(key[i], d)
+
+        if prefetch:
+            await Model.aprefetch(res, prefetch)
+        return res
+
+    @staticmethod
+    async def aprefetch(models: List[Optional['Model']], prefetch: List[str]):
+        level = Model._prefetch_level(models, prefetch)
+        while level:
+            refs = Model._prefetch_refs(level)
+            keys = list({str(k): None for k, _ in refs})
+            level = Model._prefetch_attach(refs, dict(zip(keys, await Model.amload(keys))))
+
+    async def asave(self, partial: bool = False):
+        db_driver = Model.__async_db_drivers[self.__class__.__name__]
+        Model._invalidate(self._key)
+        if partial:
+            values, unset = self._to_partial_dict()
+            if values or unset:
+                await db_driver.update_fields(self._key, values, unset)
+        else:
+            await db_driver.save_dict(self._key, self.to_dict())
+        self._dirty.clear()
+
+    @classmethod
+    async def amsave(cls, models: List[_KT], partial: bool = False):
+        db_driver = Model.__async_db_drivers[cls.__name__]
+        keys = [m._key for m in models]
+        for k in keys:
+            Model._invalidate(k)
+        if partial:
+            updates = [m._to_partial_dict() for m in models]
+            await db_driver.mupdate_fields(keys, [u[0] for u in updates], [u[1] for u in updates])
+        else:
+            await db_driver.msave_dict(keys, [m.to_dict() for m in models])
+        for m in models:
+            m._dirty.clear()
+
+    async def aappend_to(self, field: str, values: List[Primitive]):
+        db_driver = Model.__async_db_drivers[self.__class__.__name__]
+        Model._invalidate(self._key)
+        if self._append_values(field, values):
+            await db_driver.update_fields(self._key, {field: self._values[field]}, [])
+        else:
+            await db_driver.append_list(self._key, field, values)
+
+    async def adelete(self):
+        await Model.adelete_by_key(self._key)
+
+    @staticmethod
+    async def adelete_by_key(key: str):
+        db_driver = Model.__async_db_drivers[key.split(':')[0]]
+        Model._invalidate(key)
+        await db_driver.delete(key)
+
     def to_dict_transform(self, data: Dict[str, Any]) -> ModelDict:
         """
         This should be overridden if necessary and transform values to primitive types
@@ -306,10 +933,28 @@ class Model(Generic[_KT]):
         return data
 
     def to_dict(self) -> ModelDict:
+        if self._projection is not None:
+            self._load_projected()
+        return self._to_dict()
+
+    def _to_dict(self) -> ModelDict:
+        defaults = self._spec.default_values
+        arrays = self._spec.array_fields
         values = {}
         for k, v in self._values.items():
-            if k not in self._defaults or self._defaults[k] != v:
+            if k not in defaults:
                 values[k] = v
+            elif k in arrays:
+                # Arrays compare element-wise
+                if v is not defaults[k]:
+                    values[k] = v
+            else:
+                try:
+                    if defaults[k] != v:
+                        values[k] = v
+                except ValueError:
+                    # Values that do not compare to a single `bool`, such as arrays in untyped properties
+                    values[k] = v
         values = self.to_dict_transform(values)
         return values
 
@@ -318,22 +963,146 @@ class Model(Generic[_KT]):
         model_name = key.split(':')[0]
         model_cls = Model.__models[model_name].model_cls
         data = model_cls.from_dict_transform(data)
-        model = model_cls(key, **data)
+        return model_cls._from_trusted_dict(key, data)
+
+    @classmethod
+    def _from_trusted_dict(cls, key: str, data: Dict[str, Any]) -> _KT:
+        """
+        Create a model from data loaded by a driver, without validating the properties.
+        The model takes ownership of `data`.
+        """
+        model = cls.__new__(cls)
+        object.__setattr__(model, '_key', key)
+        object.__setattr__(model, '_values', data)
+        object.__setattr__(model, '_dirty', set())
+        object.__setattr__(model, '_projection', None)
         return model
 
-    def save(self):
+    @property
+    def dirty_fields(self) -> Set[str]:
+        """
+        Properties that were assigned, or mutable properties that were read, since the model was loaded or saved
+        """
+        return set(self._dirty)
+
+    @property
+    def projection(self) -> Optional[Set[str]]:
+        """
+        Properties loaded with `load(key, fields=...)`, or `None` if the model is fully loaded
+        """
+        return None if self._projection is None else set(self._projection)
+
+    def _load_projected(self):
+        """
+        Load the properties that were left out of the projection
+        """
+        fields = [k for k in self._spec.annotations if k[0] != '_' and k not in self._projection]
+        self._projection = None
+        if not fields:
+            return
         db_driver = Model.__db_drivers[self.__class__.__name__]
-        db_driver.save_dict(self._key, self.to_dict())
+        data = db_driver.load_fields(self._key, fields)
+        if data is None:
+            return
+        for k, v in self.from_dict_transform(data).items():
+            if k not in self._values:
+                self._values[k] = v
+
+    def _to_partial_dict(self) -> Tuple[ModelDict, List[str]]:
+        data = self._to_dict()
+        values = {k: data[k] for k in self._dirty if k in data}
+        unset = [k for k in self._dirty if k not in data]
+        return values, unset
+
+    def save(self, partial: bool = False):
+        """
+        Save the model. If `partial` is set only the dirty properties are sent to the driver.
+        Within a `session` the save is deferred until the session is flushed.
+        """
+        session = current_session()
+        if session is not None:
+            return session.save(self, partial)
+        db_driver = Model.__db_drivers[self.__class__.__name__]
+        Model._invalidate(self._key)
+        if partial:
+            values, unset = self._to_partial_dict()
+            if values or unset:
+                db_driver.update_fields(self._key, values, unset)
+        else:
+            db_driver.save_dict(self._key, self.to_dict())
+        self._dirty.clear()
 
     @classmethod
-    def msave(cls, models: List[_KT]):
+    def msave(cls, models: List[_KT], partial: bool = False):
+        session = current_session()
+        if session is not None:
+            for m in models:
+                session.save(m, partial)
+            return
         db_driver = Model.__db_drivers[cls.__name__]
         keys = [m._key for m in models]
-        dicts = [m.to_dict() for m in models]
-        db_driver.msave_dict(keys, dicts)
+        for k in keys:
+            Model._invalidate(k)
+        if partial:
+            updates = [m._to_partial_dict() for m in models]
+            db_driver.mupdate_fields(keys, [u[0] for u in updates], [u[1] for u in updates])
+        else:
+            dicts = [m.to_dict() for m in models]
+            db_driver.msave_dict(keys, dicts)
+        for m in models:
+            m._dirty.clear()
+
+    def _append_values(self, field: str, values: List[Primitive]) -> bool:
+        """
+        Append to the list property in memory.
+        Returns `True` if the driver has to set the whole list, because the stored
+        record omits a property that is equal to a non-empty default.
+        """
+        if field not in self._spec.annotations:
+            raise ValueError(f'Unknown property {field}')
+
+        is_dirty = field in self._dirty
+        current = getattr(self, field)
+        default = self._spec.default_values.get(field, None)
+        is_set = bool(default) and current == default
+        current.extend(values)
+        if not is_dirty:
+            self._dirty.discard(field)
+
+        return is_set
+
+    def append_to(self, field: str, values: List[Primitive]):
+        """
+        Append `values` to a list property, sending only the new values to the driver
+        """
+        db_driver = Model.__db_drivers[self.__class__.__name__]
+        Model._invalidate(self._key)
+        if self._append_values(field, values):
+            db_driver.update_fields(self._key, {field: self._values[field]}, [])
+        else:
+            db_driver.append_list(self._key, field, values)
+
+    @classmethod
+    def mappend_to(cls, models: List[_KT], field: str, values: List[List[Primitive]]):
+        db_driver = Model.__db_drivers[cls.__name__]
+        keys = []
+        appends = []
+        for m, v in zip(models, values):
+            Model._invalidate(m._key)
+            if m._append_values(field, v):
+                db_driver.update_fields(m._key, {field: m._values[field]}, [])
+            else:
+                keys.append(m._key)
+                appends.append(v)
+        if keys:
+            db_driver.mappend_list(keys, field, appends)
 
     def delete(self):
+        session = current_session()
+        if session is not None:
+            return session.delete(self._key)
         db_driver = Model.__db_drivers[self.__class__.__name__]
+        Model._invalidate(self._key)
         db_driver.delete(self._key)
 
     def __repr__(self):
@@ -1,4 +1,4 @@
-from typing import Union, Optional
+from typing import Union, Optional, List
 
 from ..types import ModelDict
 
@@ -6,9 +6,24 @@ from ..types import ModelDict
 class Serializer:
     file_extension = 'data'
     is_bytes = False
+    # Whether `from_string` can read from a `mmap`
+    is_mappable = False
 
     def to_string(self, data: ModelDict) -> Union[str, bytes]:
         raise NotImplementedError
 
+    def to_chunks(self, data: ModelDict) -> List[Union[str, bytes, memoryview]]:
+        """
+        Serialized data as a list of chunks, so that large buffers can be written without joining them
+        """
+        return [self.to_string(data)]
+
     def from_string(self, data: Union[str, bytes, None]) -> Optional[ModelDict]:
         raise NotImplementedError
+
+    def without_keys(self) -> 'Serializer':
+        """
+        Serializer for models that cannot hold `Key`s, which can skip decoding keys.
+        It must read and write the same format.
+        """
+        return self
@@ -0,0 +1,139 @@
+import copy
+import struct
+import zlib
+from typing import Optional, Union, List, Dict
+
+from . import Serializer
+from ..types import ModelDict
+
+MAGIC = b'\x00LDB'
+_HEADER = struct.Struct('<4sBI')
+
+_NONE = 0
+_ZLIB = 1
+_LZMA = 2
+_METHODS = {'zlib': _ZLIB, 'lzma': _LZMA}
+
+
+class CompressedSerializer(Serializer):
+    """
+    Compresses the output of another serializer with `zlib` or `lzma`,
+    when it is at least `threshold` bytes long.
+
+    Compressed records start with a header, and records without it are passed to
+    the wrapped serializer as they are, so existing data stays readable.
+    `zdict` is a preset dictionary for `zlib` (see `train_dictionary`);
+    records compressed with a different dictionary cannot be read.
+    """
+    is_bytes = True
+
+    def __init__(self, serializer: Serializer, method: str = 'zlib', threshold: int = 256,
+                 level: Optional[int] = None, zdict: Optional[bytes] = None):
+        if method not in _METHODS:
+            raise ValueError(f'Unknown compression method {method}')
+        if zdict is not None and method != 'zlib':
+            raise ValueError('Preset dictionaries are only supported with zlib')
+        self._serializer = serializer
+        self.file_extension = serializer.file_extension
+        self._method = _METHODS[method]
+        self._threshold = threshold
+        self._level = level
+        self._zdict = zdict
+        self._zdict_crc = 0 if zdict is None else zlib.crc32(zdict)
+
+    def _compress(self, data: bytes) -> bytes:
+        if self._method == _LZMA:
+            import lzma
+            return lzma.compress(data, preset=6 if self._level is None else self._level)
+
+        level = -1 if self._level is None else self._level
+        if self._zdict is None:
+            return zlib.compress(data, level)
+        compressor = zlib.compressobj(level, zdict=self._zdict)
+        return compressor.compress(data) + compressor.flush()
+
+    def _decompress(self, method: int, zdict_crc: int, data: memoryview) -> bytes:
+        if method == _NONE:
+            return bytes(data)
+        if method == _LZMA:
+            import lzma
+            return lzma.decompress(data)
+        if method != _ZLIB:
+            raise ValueError(f'Unknown compression method {method}')
+
+        if zdict_crc == 0:
+            return zlib.decompress(data)
+        if zdict_crc != self._zdict_crc:
+            raise ValueError('Record was compressed with a different preset dictionary')
+        decompressor = zlib.decompressobj(zdict=self._zdict)
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def to_string(self, data: ModelDict) -> bytes:
+        raw = self._serializer.to_string(data)
+        if not self._serializer.is_bytes:
+            raw = raw.encode('utf-8')
+
+        if len(raw) >= self._threshold:
+            return _HEADER.pack(MAGIC, self._method, self._zdict_crc) + self._compress(raw)
+        elif raw[:len(MAGIC)] == MAGIC:
+            return _HEADER.pack(MAGIC, _NONE, 0) + raw
+        else:
+            return raw
+
+    def from_string(self, data: Union[str, bytes, None]) -> Optional[ModelDict]:
+        if data is None:
+            return None
+        if isinstance(data, str):
+            return self._serializer.from_string(data)
+
+        if data[:len(MAGIC)] == MAGIC:
+            _, method, zdict_crc = _HEADER.unpack_from(data)
+            data = self._decompress(method, zdict_crc, memoryview(data)[_HEADER.size:])
+        if not self._serializer.is_bytes:
+            data = data.decode('utf-8')
+        return self._serializer.from_string(data)
+
+    def without_keys(self) -> 'CompressedSerializer':
+        serializer = copy.copy(self)
+        serializer._serializer = self._serializer.without_keys()
+        return serializer
+
+
+def train_dictionary(samples: List[Union[str, bytes]], size: int = 32 * 1024, gram: int = 8) -> bytes:
+    """
+    Build a `zlib` preset dictionary from a sample of serialized records.
+
+    It collects the byte sequences that occur in more than one sample,
+    and places the most common ones at the end of the dictionary,
+    where `zlib` can refer to them with the shortest distances.
+    """
+    samples = [s.encode('utf-8') if isinstance(s, str) else bytes(s) for s in samples]
+    counts: Dict[bytes, int] = {}
+    for s in samples:
+        for g in {s[i:i + gram] for i in range(len(s) - gram + 1)}:
+            counts[g] = counts.get(g, 0) + 1
+
+    min_count = max(2, len(samples) // 10)
+    fragments: Dict[bytes, int] = {}
+    for s in samples:
+        start = None
+        score = 0
+        for i in range(len(s) - gram + 2):
+            c = counts.get(s[i:i + gram], 0) if i <= len(s) - gram else 0
+            if c >= min_count:
+                if start is None:
+                    start = i
+                    score = c
+                score = min(score, c)
+            elif start is not None:
+                fragment = s[start:i - 1 + gram]
+                fragments[fragment] = max(fragments.get(fragment, 0), score)
+                start = None
+
+    res = b''
+    for fragment, _ in sorted(fragments.items(), key=lambda x: (-x[1], -len(x[0]))):
+        if len(res) + len(fragment) > size:
+            continue
+        res = fragment + res
+
+    return res
@@ -1,19 +1,32 @@
+import copy
 import json
 from typing import Optional
 
 from . import Serializer
-from .utils import encode_keys, decode_keys
+from .utils import encode_json_default, decode_key
 from ..types import ModelDict
 
 
+def _decode(data: dict):
+    if '__key__' in data:
+        return decode_key(data)
+    return data
+
+
 class JsonSerializer(Serializer):
     file_extension = 'json'
+    _object_hook = staticmethod(_decode)
 
     def to_string(self, data: ModelDict) -> str:
         assert data
-        return json.dumps(encode_keys(data))
+        return json.dumps(data, default=encode_json_default)
 
     def from_string(self, data: Optional[str]) -> Optional[ModelDict]:
         if data is None:
             return None
-        return decode_keys(json.loads(data))
+        return json.loads(data, object_hook=self._object_hook)
+
+    def without_keys(self) -> 'JsonSerializer':
+        serializer = copy.copy(self)
+        serializer._object_hook = None
+        return serializer
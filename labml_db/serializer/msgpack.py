@@ -0,0 +1,53 @@
+from typing import Optional
+
+from . import Serializer
+from ..model import Key
+from ..types import ModelDict
+
+KEY_EXT_TYPE = 1
+
+_msgpack = None
+
+
+def _get_msgpack():
+    """
+    Import `msgpack` on first use, like the other optional backends
+    """
+    global _msgpack
+    if _msgpack is None:
+        try:
+            import msgpack
+        except ImportError as e:
+            raise ImportError('MsgPackSerializer needs the msgpack package; install it with `pip install msgpack`') from e
+        _msgpack = msgpack
+
+    return _msgpack
+
+
+class MsgPackSerializer(Serializer):
+    """
+    MessagePack serializer. `Key`s are stored as an extension type,
+    so loading does not need to walk the data.
+    """
+    file_extension = 'msgpack'
+    is_bytes = True
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, Key):
+            return _get_msgpack().ExtType(KEY_EXT_TYPE, str(value).encode('utf-8'))
+        raise TypeError(f'Object of type {type(value).__name__} is not MessagePack serializable')
+
+    @staticmethod
+    def _decode(code: int, data: bytes):
+        if code == KEY_EXT_TYPE:
+            return Key(data.decode('utf-8'))
+        return _get_msgpack().ExtType(code, data)
+
+    def to_string(self, data: ModelDict) -> bytes:
+        return _get_msgpack().packb(data, default=self._encode, use_bin_type=True)
+
+    def from_string(self, data: Optional[bytes]) -> Optional[ModelDict]:
+        if data is None:
+            return None
+        return _get_msgpack().unpackb(data, ext_hook=self._decode, raw=False, strict_map_key=False)
@@ -0,0 +1,47 @@
+import copy
+import json
+from typing import Optional, Union
+
+from . import Serializer
+from .utils import encode_json_default, decode_keys
+from ..types import ModelDict
+
+
+class OrjsonSerializer(Serializer):
+    """
+    JSON serializer backed by `orjson`.
+    It reads and writes the same format as `JsonSerializer`, and uses the standard
+    `json` module if `orjson` is not installed.
+    """
+    file_extension = 'json'
+    is_bytes = True
+    _decode_keys = True
+
+    def __init__(self):
+        try:
+            import orjson
+        except ImportError:
+            orjson = None
+        self._orjson = orjson
+
+    def to_string(self, data: ModelDict) -> bytes:
+        assert data
+        if self._orjson is None:
+            return json.dumps(data, default=encode_json_default).encode('utf-8')
+        return self._orjson.dumps(data, default=encode_json_default, option=self._orjson.OPT_NON_STR_KEYS)
+
+    def from_string(self, data: Union[str, bytes, None]) -> Optional[ModelDict]:
+        if data is None:
+            return None
+        if self._orjson is None:
+            data = json.loads(data)
+        else:
+            data = self._orjson.loads(data)
+        if self._decode_keys:
+            data = decode_keys(data)
+        return data
+
+    def without_keys(self) -> 'OrjsonSerializer':
+        serializer = copy.copy(self)
+        serializer._decode_keys = False
+        return serializer
@@ -1,9 +1,17 @@
+import io
 import pickle
-from typing import Optional
+import struct
+import sys
+from typing import Optional, List, Union
 
 from . import Serializer
 from ..types import ModelDict
 
+_OOB_MAGIC = b'LDBPKL5\x00'
+_OOB_HEADER = struct.Struct('<8sIQ')
+_OOB_BUFFER = struct.Struct('<QQ')
+_OOB_ALIGN = 64
+
 
 class PickleSerializer(Serializer):
     file_extension = 'pkl'
@@ -16,3 +24,78 @@ class PickleSerializer(Serializer):
         if data is None:
             return None
         return pickle.loads(data)
+
+
+class _OutOfBandPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        np = sys.modules.get('numpy', None)
+        if np is not None and type(obj) is np.memmap:
+            # `np.memmap` pickles in-band; arrays loaded from `.npy` files are memory-mapped
+            return obj.view(np.ndarray).__reduce_ex__(5)
+        return NotImplemented
+
+
+class Pickle5Serializer(Serializer):
+    """
+    Pickle protocol 5 with the buffers of numpy arrays of at least `threshold` bytes
+    stored out-of-band, after the pickle stream at 64-byte aligned offsets.
+
+    `from_string` accepts a `mmap`; arrays are then backed by the mapped
+    file without copying, and are read-only.
+    `bytes` values are pickled in-band, since they can't be loaded without a copy.
+    """
+    file_extension = 'pkl5'
+    is_bytes = True
+    is_mappable = True
+
+    def __init__(self, threshold: int = 4096):
+        self.threshold = threshold
+
+    def to_chunks(self, data: ModelDict) -> List[Union[bytes, memoryview]]:
+        buffers = []
+
+        def _out_of_band(buffer: pickle.PickleBuffer) -> bool:
+            # Returning `True` keeps the buffer in the pickle stream
+            if buffer.raw().nbytes < self.threshold:
+                return True
+            buffers.append(buffer)
+            return False
+
+        f = io.BytesIO()
+        _OutOfBandPickler(f, protocol=5, buffer_callback=_out_of_band).dump(data)
+        stream = f.getbuffer()
+        raw = [b.raw() for b in buffers]
+
+        offset = _OOB_HEADER.size + _OOB_BUFFER.size * len(raw) + len(stream)
+        table = []
+        chunks = [stream]
+        for b in raw:
+            padding = -offset % _OOB_ALIGN
+            chunks.append(b'\x00' * padding)
+            offset += padding
+            table.append(_OOB_BUFFER.pack(offset, b.nbytes))
+            chunks.append(b)
+            offset += b.nbytes
+
+        return [_OOB_HEADER.pack(_OOB_MAGIC, len(raw), len(stream)), *table, *chunks]
+
+    def to_string(self, data: ModelDict) -> bytes:
+        return b''.join(self.to_chunks(data))
+
+    def from_string(self, data) -> Optional[ModelDict]:
+        if data is None:
+            return None
+        view = memoryview(data)
+        if view[:len(_OOB_MAGIC)] != _OOB_MAGIC:
+            # Plain pickle
+            return pickle.loads(view)
+
+        _, count, size = _OOB_HEADER.unpack_from(view)
+        offset = _OOB_HEADER.size
+        buffers = []
+        for _ in range(count):
+            start, length = _OOB_BUFFER.unpack_from(view, offset)
+            offset += _OOB_BUFFER.size
+            buffers.append(view[start:start + length])
+
+        return pickle.loads(view[offset:offset + size], buffers=buffers)
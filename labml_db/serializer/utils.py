@@ -12,6 +12,15 @@ def decode_key(key_dict: Dict) -> Key:
     return Key(key_dict['__key__'])
 
 
+def encode_json_default(value):
+    """
+    `default` hook for JSON encoders, which are called with values they can't serialize
+    """
+    if isinstance(value, Key):
+        return encode_key(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
 def encode_keys(data: Primitive):
     if isinstance(data, Key):
         return encode_key(data)
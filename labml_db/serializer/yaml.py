@@ -1,20 +1,77 @@
+import copy
 from typing import Optional
 
 from . import Serializer
-from .utils import encode_keys, decode_keys
+from .utils import encode_key
+from ..model import Key
 from ..types import ModelDict
 
+_dumper = None
+_loaders = {}
+
+
+def _get_dumper():
+    """
+    Dumper that writes `Key`s as `{'__key__': key}` mappings
+    """
+    global _dumper
+    if _dumper is None:
+        import yaml
+        base = getattr(yaml, 'CDumper', yaml.Dumper)
+
+        class KeyDumper(base):
+            def ignore_aliases(self, data):
+                return True
+
+        KeyDumper.add_representer(Key, lambda dumper, key: dumper.represent_dict(encode_key(key)))
+        _dumper = KeyDumper
+
+    return _dumper
+
+
+def _construct_map(loader, node):
+    import yaml
+    for k, v in node.value:
+        if isinstance(k, yaml.ScalarNode) and k.value == '__key__':
+            return Key(loader.construct_scalar(v))
+    return loader.construct_yaml_map(node)
+
+
+def _get_loader(with_keys: bool):
+    """
+    Full loader, using libyaml if it is available.
+    If `with_keys` is set, `{'__key__': key}` mappings are loaded as `Key`s.
+    """
+    if with_keys not in _loaders:
+        import yaml
+        base = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+        if with_keys:
+            class KeyLoader(base):
+                pass
+
+            KeyLoader.add_constructor('tag:yaml.org,2002:map', _construct_map)
+            base = KeyLoader
+        _loaders[with_keys] = base
+
+    return _loaders[with_keys]
+
 
 class YamlSerializer(Serializer):
     file_extension = 'yaml'
+    _with_keys = True
 
     def to_string(self, data: ModelDict) -> str:
         import yaml
         assert data
-        return yaml.dump(encode_keys(data), default_flow_style=False)
+        return yaml.dump(data, Dumper=_get_dumper(), default_flow_style=False)
 
     def from_string(self, data: Optional[str]) -> Optional[ModelDict]:
         if data is None:
             return None
         import yaml
-        return decode_keys(yaml.load(data, Loader=yaml.FullLoader))
+        return yaml.load(data, Loader=_get_loader(self._with_keys))
+
+    def without_keys(self) -> 'YamlSerializer':
+        serializer = copy.copy(self)
+        serializer._with_keys = False
+        return serializer
@@ -0,0 +1,109 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple, Type, TYPE_CHECKING, Union, List
+
+from .types import ModelDict
+
+if TYPE_CHECKING:
+    from .index import Index
+    from .model import Model
+
+_session: ContextVar[Optional['Session']] = ContextVar('labml_db_session', default=None)
+
+
+class Session:
+    """
+    Unit of work that records saves, deletes and index changes,
+    and writes them with one batched call per driver on `flush`.
+
+    Repeated saves of the same key are coalesced; loads are not affected
+    and do not see pending changes.
+    """
+
+    def __init__(self):
+        self._saves: Dict[str, Tuple[Union['Model', ModelDict], bool]] = {}
+        self._deletes: Dict[str, None] = {}
+        self._index: Dict[str, Tuple[Type['Index'], Dict[str, Optional[str]]]] = {}
+
+    def save(self, model: 'Model', partial: bool = False):
+        if model._key in self._saves:
+            partial = partial and self._saves[model._key][1]
+        self._deletes.pop(model._key, None)
+        self._saves[model._key] = (model, partial)
+
+    def save_dict(self, key: str, data: ModelDict):
+        self._deletes.pop(key, None)
+        self._saves[key] = (data, False)
+
+    def delete(self, key: str):
+        self._saves.pop(key, None)
+        self._deletes[key] = None
+
+    def _index_changes(self, index_cls: Type['Index']) -> Dict[str, Optional[str]]:
+        if index_cls.__name__ not in self._index:
+            self._index[index_cls.__name__] = (index_cls, {})
+        return self._index[index_cls.__name__][1]
+
+    def index_set(self, index_cls: Type['Index'], index_key: str, model_key: str):
+        self._index_changes(index_cls)[index_key] = model_key
+
+    def index_delete(self, index_cls: Type['Index'], index_key: str):
+        self._index_changes(index_cls)[index_key] = None
+
+    def flush(self):
+        from .model import Model
+
+        saves, self._saves = self._saves, {}
+        deletes, self._deletes = self._deletes, {}
+        index, self._index = self._index, {}
+
+        models: Dict[Tuple[Type['Model'], bool], List['Model']] = {}
+        dict_keys = []
+        dicts = []
+        for k, (m, partial) in saves.items():
+            if isinstance(m, dict):
+                dict_keys.append(k)
+                dicts.append(m)
+            else:
+                models.setdefault((type(m), partial), []).append(m)
+
+        for (model_cls, partial), ms in models.items():
+            model_cls.msave(ms, partial)
+        if dict_keys:
+            Model.msave_by_key(dict_keys, dicts)
+        if deletes:
+            Model.mdelete_by_key(list(deletes))
+
+        for index_cls, changes in index.values():
+            values = {k: v for k, v in changes.items() if v is not None}
+            removed = [k for k, v in changes.items() if v is None]
+            if values:
+                index_cls.mset(values)
+            if removed:
+                index_cls.mdelete(removed)
+
+
+def current_session() -> Optional[Session]:
+    return _session.get()
+
+
+@contextmanager
+def session():
+    """
+    Record saves, deletes and index changes made within the context,
+    and flush them in batches on exit. Nothing is written if an exception is raised.
+    Nested contexts join the outermost session.
+    """
+    current = _session.get()
+    if current is not None:
+        yield current
+        return
+
+    s = Session()
+    token = _session.set(s)
+    try:
+        yield s
+    finally:
+        _session.reset(token)
+
+    s.flush()
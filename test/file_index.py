@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import shutil
+from pathlib import Path
+
+from labml_db.index_driver.file import FileIndexDbDriver
+from labml_db.serializer.yaml import YamlSerializer
+from test.simple import UsernameIndex
+
+INDEX_PATH = Path('./data/index/UserNameIndex.yaml')
+
+
+def open_driver() -> FileIndexDbDriver:
+    return FileIndexDbDriver(YamlSerializer(), UsernameIndex, INDEX_PATH, compact_entries=100)
+
+
+def test_setup():
+    shutil.rmtree(str(INDEX_PATH.parent), ignore_errors=True)
+
+
+def test_two_drivers():
+    a = open_driver()
+    b = open_driver()
+    a.mset({f'u{i}': f'User:{i}' for i in range(50)})
+    assert b.get('u7') == 'User:7'
+    b.delete('u7')
+    assert a.get('u7') is None
+    assert a.mget(['u7', 'u8']) == [None, 'User:8']
+    a.set('u7', 'User:x')
+    assert b.get_all_key_values()['u7'] == 'User:x'
+
+
+def test_compaction():
+    a = open_driver()
+    b = open_driver()
+    for i in range(300):
+        a.set(f'v{i}', f'User:{i}')
+    assert INDEX_PATH.exists()
+    assert len(b.get_all()) == 350
+    a.compact()
+    assert os.path.getsize(str(a._journal_path)) == 0
+    assert b.get('v299') == 'User:299'
+    assert len(open_driver().get_all_key_values()) == 350
+
+
+def test_torn_write():
+    with open(str(INDEX_PATH) + '.journal', 'ab') as f:
+        f.write(b'["x", "User')
+    driver = open_driver()
+    assert driver.get('x') is None
+    driver.set('y', 'User:y')
+    assert open_driver().get('y') == 'User:y'
+
+
+def _write(i: int):
+    driver = open_driver()
+    for j in range(300):
+        driver.set(f'p{i}_{j}', 'User:p')
+
+
+def test_processes():
+    processes = [multiprocessing.Process(target=_write, args=(i,)) for i in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    values = open_driver().get_all_key_values()
+    assert sum(k.startswith('p') for k in values) == 1200
+    print('file index ok')
+
+
+if __name__ == '__main__':
+    test_setup()
+    test_two_drivers()
+    test_compaction()
+    test_torn_write()
+    test_processes()
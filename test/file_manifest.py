@@ -0,0 +1,70 @@
+import multiprocessing
+import shutil
+from pathlib import Path
+
+from labml_db.driver.file import FileDbDriver
+from labml_db.serializer.json import JsonSerializer
+from test.simple import Project
+
+DB_PATH = Path('./data/manifest')
+
+
+def open_driver() -> FileDbDriver:
+    return FileDbDriver(JsonSerializer(), Project, DB_PATH, shard_depth=1, manifest=True)
+
+
+def test_setup():
+    shutil.rmtree(str(DB_PATH), ignore_errors=True)
+
+
+def test_two_drivers():
+    a = open_driver()
+    b = open_driver()
+    a.save_dict('Project:1', {'name': 'a'})
+    assert b.exists('Project:1')
+    b.delete('Project:1')
+    assert not a.exists('Project:1')
+    a.save_dict('Project:1', {'name': 'b'})
+    assert b.get_all() == ['Project:1']
+    assert b.count() == 1
+    a.delete('Project:1')
+
+
+def _write(i: int):
+    driver = open_driver()
+    for j in range(1500):
+        driver.save_dict(f'Project:{i}_{j}', {'name': str(j)})
+        if j % 2:
+            driver.delete(f'Project:{i}_{j}')
+
+
+def test_processes():
+    processes = [multiprocessing.Process(target=_write, args=(i,)) for i in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    # Each process removed enough keys to compact the manifest
+    driver = open_driver()
+    assert driver.count() == 3000
+    assert sorted(driver.get_all()) == sorted(driver._find_keys())
+
+
+def test_rebuild():
+    # A missing manifest is rebuilt from the files
+    (DB_PATH / '_Project.manifest').unlink()
+    driver = open_driver()
+    assert driver.count() == 3000
+    driver.rebuild_manifest()
+    assert driver.count() == 3000
+    assert driver.exists('Project:0_0')
+    assert not driver.exists('Project:0_1')
+    print('file manifest ok')
+
+
+if __name__ == '__main__':
+    test_setup()
+    test_two_drivers()
+    test_processes()
+    test_rebuild()
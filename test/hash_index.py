@@ -0,0 +1,80 @@
+import multiprocessing
+import random
+import shutil
+from pathlib import Path
+
+from labml_db.index_driver.hash import HashIndexDbDriver
+from test.simple import UsernameIndex
+
+INDEX_PATH = Path('./data/hash/UserNameIndex.idx')
+
+
+def open_driver() -> HashIndexDbDriver:
+    return HashIndexDbDriver(UsernameIndex, INDEX_PATH, capacity=64)
+
+
+def test_setup():
+    shutil.rmtree(str(INDEX_PATH.parent), ignore_errors=True)
+
+
+def test_set_get():
+    a = open_driver()
+    b = open_driver()
+    a.mset({f'u{i}': f'User:{i}' for i in range(1000)})
+    assert b.get('u7') == 'User:7'
+    assert b.mget(['u7', 'missing']) == ['User:7', None]
+    b.delete('u7')
+    assert a.get('u7') is None
+    assert a.count() == 999
+
+
+def test_rebuild():
+    """
+    Random sets and deletes, with rebuilds for growth and for deleted slots
+    """
+    a = open_driver()
+    b = open_driver()
+    expected = a.get_all_key_values()
+    random.seed(0)
+    for _ in range(5000):
+        k = f'k{random.randrange(500)}'
+        if random.random() < 0.3:
+            a.delete(k)
+            expected.pop(k, None)
+        else:
+            v = f'User:{random.random()}'
+            a.set(k, v)
+            expected[k] = v
+
+    assert b.get_all_key_values() == expected
+    assert len(list(INDEX_PATH.parent.glob('*.heap'))) == 1
+    a.close()
+    assert open_driver().get_all_key_values() == expected
+
+
+def _write(i: int):
+    driver = open_driver()
+    driver.mset({f'p{i}_{j}': 'User:p' for j in range(1000)})
+    for j in range(200):
+        driver.set(f'q{i}_{j}', 'User:q')
+
+
+def test_processes():
+    processes = [multiprocessing.Process(target=_write, args=(i,)) for i in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    driver = open_driver()
+    values = driver.get_all_key_values()
+    assert sum(k[0] in 'pq' for k in values) == 4800
+    assert len(values) == driver.count()
+    print('hash index ok')
+
+
+if __name__ == '__main__':
+    test_setup()
+    test_set_get()
+    test_rebuild()
+    test_processes()
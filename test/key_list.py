@@ -0,0 +1,85 @@
+import shutil
+from pathlib import Path
+from typing import List
+
+from labml_db import Model, KeyList, load_keys
+from labml_db.driver.file import FileDbDriver
+from labml_db.serializer.json import JsonSerializer
+from labml_db.serializer.yaml import YamlSerializer
+from labml_db.types import ModelDict
+from test.simple import Project, User
+
+DB_PATH = Path('./data/key_list')
+
+
+class CountingFileDbDriver(FileDbDriver):
+    """
+    Counts batched calls, to check that keys are grouped per driver
+    """
+
+    calls: List[str] = []
+
+    def mload_dict(self, key: List[str]) -> List[ModelDict]:
+        self.calls.append(f'mload {self.model_name}')
+        return super().mload_dict(key)
+
+    def msave_dict(self, key: List[str], data: List[ModelDict]):
+        self.calls.append(f'msave {self.model_name}')
+        super().msave_dict(key, data)
+
+    def mdelete_dict(self, key: List[str]):
+        self.calls.append(f'mdelete {self.model_name}')
+        super().mdelete_dict(key)
+
+
+def test_setup():
+    shutil.rmtree(str(DB_PATH), ignore_errors=True)
+    Model.set_db_drivers([
+        CountingFileDbDriver(JsonSerializer(), User, DB_PATH / 'user'),
+        CountingFileDbDriver(YamlSerializer(), Project, DB_PATH / 'project')
+    ])
+
+
+def test_load():
+    projects = [Project(name=f'p{i}') for i in range(3)]
+    users = [User(name=f'u{i}') for i in range(3)]
+    Project.msave(projects)
+    User.msave(users)
+    missing = Project(name='missing')
+
+    keys = [projects[0].key, users[0].key, missing.key, users[1].key, projects[2].key, projects[0].key]
+    CountingFileDbDriver.calls.clear()
+    loaded = KeyList(keys).load()
+    assert sorted(CountingFileDbDriver.calls) == ['mload Project', 'mload User']
+    assert [m.name if m else None for m in loaded] == ['p0', 'u0', None, 'u1', 'p2', 'p0']
+
+    loaded = load_keys([None, users[2].key, projects[1].key, None])
+    assert [m.name if m else None for m in loaded] == [None, 'u2', 'p1', None]
+
+    assert KeyList([]).load() == []
+    assert load_keys([]) == []
+
+    return projects, users
+
+
+def test_save_delete(projects, users):
+    keys = KeyList([projects[0].key, users[0].key, projects[1].key])
+    CountingFileDbDriver.calls.clear()
+    keys.save([{'name': 'a'}, {'name': 'b'}, {'name': 'c'}])
+    assert sorted(CountingFileDbDriver.calls) == ['msave Project', 'msave User']
+    assert [d['name'] for d in keys.read()] == ['a', 'b', 'c']
+
+    CountingFileDbDriver.calls.clear()
+    keys.delete()
+    assert sorted(CountingFileDbDriver.calls) == ['mdelete Project', 'mdelete User']
+    assert keys.load() == [None, None, None]
+    assert users[1].key.load().name == 'u1'
+
+    KeyList([]).save([])
+    KeyList([]).delete()
+    print('key list ok')
+
+
+if __name__ == '__main__':
+    test_setup()
+    test_save_delete(*test_load())
@@ -0,0 +1,85 @@
+import shutil
+from pathlib import Path
+
+from labml_db import Model
+from labml_db.driver.log import LogDbDriver
+from labml_db.serializer.json import JsonSerializer
+from test.simple import Project
+
+DB_PATH = Path('./data/log')
+
+
+def test_setup() -> LogDbDriver:
+    shutil.rmtree(str(DB_PATH), ignore_errors=True)
+    return open_driver()
+
+
+def open_driver() -> LogDbDriver:
+    driver = LogDbDriver(JsonSerializer(), Project, DB_PATH, max_segment_size=4096)
+    Model.set_db_drivers([driver])
+    return driver
+
+
+def test_save_load(driver: LogDbDriver):
+    projects = [Project(name=f'p{i}') for i in range(500)]
+    Project.msave(projects)
+    for p in projects[:100]:
+        p.delete()
+    for p in projects[100:200]:
+        p.name = 'renamed'
+        p.save(partial=True)
+
+    assert Project.count() == 400
+    assert projects[0].key.load() is None
+    assert projects[150].key.load().name == 'renamed'
+    assert projects[499].key.load().name == 'p499'
+    assert len(list(DB_PATH.glob('*.log'))) > 1
+    driver.close()
+
+    return projects
+
+
+def test_reopen(projects):
+    driver = open_driver()
+    assert driver.count() == 400
+    assert projects[150].key.load().name == 'renamed'
+
+    try:
+        LogDbDriver(JsonSerializer(), Project, DB_PATH)
+        assert False, 'A second driver opened the same directory'
+    except RuntimeError:
+        pass
+
+    driver.compact()
+    driver.close()
+
+    driver = open_driver()
+    assert driver.count() == 400
+    assert projects[499].key.load().name == 'p499'
+    driver.close()
+
+
+def test_recovery(projects):
+    for hint in DB_PATH.glob('*.hint'):
+        data = hint.read_bytes()
+        hint.write_bytes(data[:-3])
+    segment = sorted(DB_PATH.glob('*.log'))[-1]
+    with open(str(segment), 'ab') as f:
+        f.write(b'\x01\x02\x03partial record')
+
+    driver = open_driver()
+    assert driver.count() == 400
+    assert projects[150].key.load().name == 'renamed'
+    Project(name='after').save()
+    driver.close()
+
+    driver = open_driver()
+    assert driver.count() == 401
+    driver.close()
+    print('log driver ok')
+
+
+if __name__ == '__main__':
+    _projects = test_save_load(test_setup())
+    test_reopen(_projects)
+    test_recovery(_projects)
@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+from labml import monit, logger
+
+from labml_db import Model
+
+
+class Experiment(Model['Experiment']):
+    name: str
+    step: int
+    tags: List[str]
+    comment: Optional[str]
+
+    @classmethod
+    def defaults(cls):
+        return dict(step=0, tags=[])
+
+
+def test(n):
+    with monit.section('Construct'):
+        models = [Experiment(name=f'exp{i}', step=i) for i in range(n)]
+
+    dicts = [m.to_dict() for m in models]
+    keys = [m._key for m in models]
+
+    with monit.section('from_dict'):
+        models = [Model.from_dict(k, d) for k, d in zip(keys, dicts)]
+
+    with monit.section('Read set properties'):
+        for m in models:
+            _ = m.name
+            _ = m.step
+
+    with monit.section('Read defaults'):
+        for m in models:
+            _ = m.comment
+            _ = m.tags
+
+    with monit.section('Write properties'):
+        for m in models:
+            m.step = 1
+
+    with monit.section('to_dict'):
+        dicts = [m.to_dict() for m in models]
+
+    logger.log(f'{len(dicts)}')
+
+
+if __name__ == '__main__':
+    test(100_000)
@@ -0,0 +1,63 @@
+from pymongo import MongoClient
+
+from labml_db import Model
+from labml_db.driver.mongo import MongoDbDriver
+from test.simple import User, Project
+
+
+def test_setup():
+    db = MongoClient("mongodb://localhost:27017/")['testdb']
+    Model.set_db_drivers([
+        MongoDbDriver(User, db),
+        MongoDbDriver(Project, db)
+    ])
+
+
+def test_load():
+    project = Project(name='nlp', experiments=3)
+    project.save()
+    user = User(name='John', occupation='test')
+    user.projects.append(project.key)
+    user.save()
+
+    loaded = User.load(str(user.key), fields=['name'])
+    assert loaded.projection == {'name'}
+    assert loaded.name == 'John'
+    # The other properties are loaded when they are first read
+    assert loaded.projects[0].load().experiments == 3
+    assert loaded.projection is None
+    assert loaded.occupation == 'test'
+
+    assert User.load('User:000000000000000000000000', fields=['name']) is None
+
+    # A projected model can be saved partially
+    loaded = Project.load(str(project.key), fields=['experiments'])
+    loaded.experiments += 1
+    loaded.save(partial=True)
+    loaded = project.key.load()
+    assert loaded.name == 'nlp'
+    assert loaded.experiments == 4
+
+    return project
+
+
+def test_mload(project: Project):
+    projects = [Project(name=f'p{i}', experiments=i) for i in range(5)]
+    Project.msave(projects)
+    keys = [str(p.key) for p in projects] + [str(project.key)]
+    loaded = Project.mload(keys, fields=['name'])
+    assert [p.name for p in loaded] == ['p0', 'p1', 'p2', 'p3', 'p4', 'nlp']
+    assert all(p.projection == {'name'} for p in loaded)
+    assert loaded[2].experiments == 2
+
+    count = 0
+    for p in Project.iter_all(batch_size=2, fields=['experiments']):
+        assert p.projection == {'experiments'}
+        count += 1
+    assert count == Project.count()
+    print('mongo projection ok')
+
+
+if __name__ == '__main__':
+    test_setup()
+    test_mload(test_load())
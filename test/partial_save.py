@@ -0,0 +1,123 @@
+import shutil
+from pathlib import Path
+
+from labml_db import Model
+from labml_db.driver.file import FileDbDriver
+from labml_db.driver.log import LogDbDriver
+from labml_db.driver.sqlite import SqliteDbDriver, SqliteDatabase
+from labml_db.serializer.json import JsonSerializer
+from labml_db.serializer.pickle import PickleSerializer
+from test.simple import Project, User
+
+DB_PATH = Path('./data/partial')
+
+
+def test_setup():
+    shutil.rmtree(str(DB_PATH), ignore_errors=True)
+
+
+def file_drivers():
+    return [FileDbDriver(JsonSerializer(), User, DB_PATH / 'file' / 'user'),
+            FileDbDriver(PickleSerializer(), Project, DB_PATH / 'file' / 'project')]
+
+
+def log_drivers():
+    return [LogDbDriver(JsonSerializer(), User, DB_PATH / 'log' / 'user'),
+            LogDbDriver(JsonSerializer(), Project, DB_PATH / 'log' / 'project')]
+
+
+def sqlite_drivers():
+    db = SqliteDatabase(DB_PATH / 'sqlite' / 'db.sqlite')
+    return [SqliteDbDriver(JsonSerializer(), User, db), SqliteDbDriver(JsonSerializer(), Project, db)]
+
+
+def test_dirty():
+    project = Project(name='nlp')
+    assert project.dirty_fields == {'name'}
+    project.save()
+    assert project.dirty_fields == set()
+
+    project = project.key.load()
+    assert project.dirty_fields == set()
+    project.experiments += 1
+    assert project.dirty_fields == {'experiments'}
+
+    user = User(name='John')
+    user.save()
+    user = user.key.load()
+    # Mutable values can be changed in place, so they are dirty once read
+    user.projects.append(project.key)
+    assert user.dirty_fields == {'projects'}
+
+
+def test_partial():
+    project = Project(name='nlp', experiments=1)
+    project.save()
+
+    # Two copies that change different properties
+    a = project.key.load()
+    b = project.key.load()
+    a.name = 'cv'
+    a.save(partial=True)
+    b.experiments = 5
+    b.save(partial=True)
+
+    loaded = project.key.load()
+    assert loaded.name == 'cv'
+    assert loaded.experiments == 5
+
+    # A full save writes all properties
+    b.save()
+    assert project.key.load().name == 'nlp'
+
+    # Nothing to save
+    loaded = project.key.load()
+    loaded.save(partial=True)
+    assert project.key.load().experiments == 5
+
+
+def test_unset():
+    user = User(name='John', occupation='test')
+    user.save()
+
+    user = user.key.load()
+    user.occupation = None
+    user.save(partial=True)
+    user = user.key.load()
+    assert user.occupation is None
+    assert user.name == 'John'
+
+    project = Project(name='nlp', experiments=3)
+    project.save()
+    project = project.key.load()
+    # Properties set back to the default are removed from the record
+    project.experiments = 0
+    project.save(partial=True)
+    assert project.key.load().experiments == 0
+    assert project.key.load().name == 'nlp'
+
+
+def test_msave():
+    projects = [Project(name=f'p{i}') for i in range(10)]
+    Project.msave(projects)
+    projects = [p.key.load() for p in projects]
+    for i, p in enumerate(projects):
+        p.experiments = i
+    Project.msave(projects, partial=True)
+
+    for i, p in enumerate(projects):
+        loaded = p.key.load()
+        assert loaded.name == f'p{i}'
+        assert loaded.experiments == i
+        assert p.dirty_fields == set()
+
+
+if __name__ == '__main__':
+    test_setup()
+    for drivers in (file_drivers, log_drivers, sqlite_drivers):
+        Model.set_db_drivers(drivers())
+        test_dirty()
+        test_partial()
+        test_unset()
+        test_msave()
+    print('partial save ok')
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import numpy as np
+from labml import monit, logger
+
+from labml_db import Model
+from labml_db.driver.file import FileDbDriver
+from labml_db.serializer.json import JsonSerializer
+
+
+class ArrayModel(Model['ArrayModel']):
+    data: np.ndarray
+
+    @classmethod
+    def defaults(cls):
+        return dict(data=None)
+
+
+def test_setup():
+    Model.set_db_drivers([
+        FileDbDriver(JsonSerializer(), ArrayModel, Path('./data/array')),
+    ])
+
+
+def test_arrays(length, n):
+    data = np.array([i * 0.5 - 1e-7 for i in range(length)])
+    with monit.section('Array save'):
+        for i in range(n):
+            m = ArrayModel(data=data)
+            m.save()
+
+    with monit.section('Array Load'):
+        keys = ArrayModel.get_all()
+        m = [k.load() for k in keys]
+        logger.log(f'{len(m)}')
+
+    with monit.section('Array sum'):
+        s = sum(float(x.data.sum()) for x in m)
+        logger.log(f'{s}')
+
+
+if __name__ == '__main__':
+    test_setup()
+    test_arrays(1000_000, 10)
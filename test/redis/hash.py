@@ -0,0 +1,102 @@
+import redis
+
+from labml_db import Model
+from labml_db.driver.redis import RedisHashDbDriver
+from labml_db.serializer.json import JsonSerializer
+from labml_db.serializer.pickle import PickleSerializer
+from test.simple import User, Project
+
+
+def test_setup():
+    db = redis.Redis(host='localhost', port=6379, db=0)
+    Model.set_db_drivers([
+        RedisHashDbDriver(PickleSerializer(), User, db),
+        RedisHashDbDriver(JsonSerializer(), Project, db)
+    ])
+
+
+def test():
+    project = Project(name='nlp', experiments=2)
+    project.save()
+    user = User(name='John', occupation='test')
+    user.projects.append(project.key)
+    user.save()
+
+    loaded = user.key.load()
+    assert loaded.name == 'John'
+    assert loaded.occupation == 'test'
+    assert loaded.projects[0].load().experiments == 2
+    return user, project
+
+
+def test_projection(user: User):
+    loaded = User.load(str(user.key), fields=['name'])
+    assert loaded.projection == {'name'}
+    assert loaded.name == 'John'
+    # The other properties are loaded when they are first read
+    assert loaded.occupation == 'test'
+    assert loaded.projection is None
+    assert len(loaded.projects) == 1
+
+    loaded = User.mload([str(user.key), 'User:missing'], fields=['occupation'])
+    assert loaded[0].occupation == 'test'
+    assert loaded[1] is None
+
+
+def test_partial(project: Project):
+    a = project.key.load()
+    b = project.key.load()
+    a.name = 'cv'
+    a.save(partial=True)
+    b.experiments = 5
+    b.save(partial=True)
+    loaded = project.key.load()
+    assert loaded.name == 'cv'
+    assert loaded.experiments == 5
+
+    # Back to the default value, so the field is removed from the hash
+    loaded.experiments = 0
+    loaded.save(partial=True)
+    assert project.key.load().experiments == 0
+    assert project.key.load().name == 'cv'
+
+
+def test_append(user: User):
+    extra = [Project(name=f'p{i}') for i in range(3)]
+    Project.msave(extra)
+    user.append_to('projects', [p.key for p in extra[:2]])
+    user.key.load().append_to('projects', [extra[2].key])
+    loaded = user.key.load()
+    assert [p.load().name for p in loaded.projects] == ['cv', 'p0', 'p1', 'p2']
+
+    # A partial save folds the appended values into the hash
+    loaded.occupation = 'other'
+    loaded.save(partial=True)
+    loaded = user.key.load()
+    assert len(loaded.projects) == 4
+    assert loaded.occupation == 'other'
+    assert User.load(str(user.key), fields=['projects']).projects[3].load().name == 'p2'
+
+
+def test_msave():
+    projects = [Project(name=f'm{i}', experiments=i) for i in range(10)]
+    Project.msave(projects)
+    loaded = Project.mload([str(p.key) for p in projects])
+    assert [p.experiments for p in loaded] == list(range(10))
+
+    # Only default values, so the hash is empty but the model exists
+    empty = Project()
+    empty.save()
+    assert Project.exists(str(empty.key))
+    assert empty.key.load().name == ''
+    assert Project.load(str(empty.key), fields=['name']).experiments == 0
+    print('redis hash ok')
+
+
+if __name__ == '__main__':
+    test_setup()
+    user, project = test()
+    test_projection(user)
+    test_partial(project)
+    test_append(user)
+    test_msave()
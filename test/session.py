@@ -0,0 +1,124 @@
+import shutil
+from pathlib import Path
+
+from labml_db import Model, Index, session
+from labml_db.driver.file import FileDbDriver
+from labml_db.driver.sqlite import SqliteDatabase
+from labml_db.index_driver.file import FileIndexDbDriver
+from labml_db.index_driver.hash import HashIndexDbDriver
+from labml_db.index_driver.sqlite import SqliteIndexDbDriver
+from labml_db.serializer.json import JsonSerializer
+from labml_db.serializer.yaml import YamlSerializer
+from test.key_list import CountingFileDbDriver
+from test.simple import Project, User, UsernameIndex
+
+DB_PATH = Path('./data/session')
+
+
+def test_setup():
+    shutil.rmtree(str(DB_PATH), ignore_errors=True)
+    Model.set_db_drivers([
+        FileDbDriver(JsonSerializer(), User, DB_PATH / 'user'),
+        CountingFileDbDriver(YamlSerializer(), Project, DB_PATH / 'project')
+    ])
+    Index.set_db_drivers([
+        FileIndexDbDriver(JsonSerializer(), UsernameIndex, DB_PATH / 'UserNameIndex.json')
+    ])
+
+
+def test_session():
+    projects = [Project(name=f'p{i}') for i in range(5)]
+    user = User(name='session')
+    with session():
+        for p in projects:
+            p.save()
+            p.experiments = 1
+            p.save(partial=True)
+        user.save()
+        UsernameIndex.set(user.name, user.key)
+        projects[0].delete()
+        # Nothing is written until the session is flushed
+        assert projects[1].key.load() is None
+        assert UsernameIndex.get(user.name) is None
+
+    assert projects[0].key.load() is None
+    assert [p.key.load().experiments for p in projects[1:]] == [1, 1, 1, 1]
+    assert UsernameIndex.get(user.name) == user.key
+
+    with session():
+        UsernameIndex.delete(user.name)
+        user.delete()
+        # A save after the delete wins
+        projects[0].save()
+    assert UsernameIndex.get(user.name) is None
+    assert user.key.load() is None
+    assert projects[0].key.load().name == 'p0'
+
+
+def test_nested():
+    project = Project(name='nested')
+    with session():
+        with session():
+            project.save()
+        assert project.key.load() is None
+    assert project.key.load().name == 'nested'
+
+
+def test_error():
+    project = Project(name='error')
+    try:
+        with session():
+            project.save()
+            UsernameIndex.set('error', project.key)
+            raise ValueError()
+    except ValueError:
+        pass
+    assert project.key.load() is None
+    assert UsernameIndex.get('error') is None
+
+
+def test_empty():
+    index_drivers = [
+        FileIndexDbDriver(JsonSerializer(), UsernameIndex, DB_PATH / 'UserNameIndex.json'),
+        HashIndexDbDriver(UsernameIndex, DB_PATH / 'UserNameIndex.hash'),
+        SqliteIndexDbDriver(UsernameIndex, SqliteDatabase(DB_PATH / 'index.sqlite')),
+    ]
+    for driver in index_drivers:
+        Index.set_db_drivers([driver])
+        UsernameIndex.mset({})
+        UsernameIndex.mdelete([])
+        UsernameIndex.set('empty', User(name='empty').key)
+        UsernameIndex.mdelete([])
+        assert UsernameIndex.get('empty') is not None
+        with session():
+            UsernameIndex.mset({})
+            UsernameIndex.mdelete([])
+        UsernameIndex.delete('empty')
+    Index.set_db_drivers([index_drivers[0]])
+
+    Project.msave([])
+    with session():
+        pass
+
+
+def test_coalesce():
+    projects = [Project(name=f'c{i}') for i in range(10)]
+    CountingFileDbDriver.calls.clear()
+    with session():
+        for p in projects:
+            p.save()
+            p.save()
+        for p in projects[:5]:
+            p.delete()
+    assert CountingFileDbDriver.calls == ['msave Project', 'mdelete Project']
+    assert [p.key.load() is None for p in projects] == [True] * 5 + [False] * 5
+    print('session ok')
+
+
+if __name__ == '__main__':
+    test_setup()
+    test_session()
+    test_nested()
+    test_error()
+    test_empty()
+    test_coalesce()
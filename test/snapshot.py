@@ -0,0 +1,117 @@
+import shutil
+from pathlib import Path
+
+from labml_db import Model
+from labml_db.driver import DbDriver
+from labml_db.driver.file import FileDbDriver
+from labml_db.driver.snapshot import SnapshotDbDriver, export_snapshot
+from labml_db.serializer.json import JsonSerializer
+from labml_db.serializer.pickle import PickleSerializer
+from test.simple import Project, User
+
+DB_PATH = Path('./data/snapshot')
+
+
+def test_setup():
+    shutil.rmtree(str(DB_PATH), ignore_errors=True)
+    drivers = [
+        FileDbDriver(PickleSerializer(), User, DB_PATH / 'user'),
+        FileDbDriver(JsonSerializer(), Project, DB_PATH / 'project')
+    ]
+    Model.set_db_drivers(drivers)
+    return drivers
+
+
+def test_export(drivers):
+    projects = [Project(name=f'p{i}', experiments=i) for i in range(25)]
+    Project.msave(projects)
+    user = User(name='John', occupation='test')
+    user.projects.append(projects[0].key)
+    user.save()
+
+    user_driver, project_driver = drivers
+    export_snapshot(user_driver, DB_PATH / 'user.snap')
+    export_snapshot(project_driver, DB_PATH / 'project.snap', batch_size=7)
+    Model.set_db_drivers([
+        SnapshotDbDriver(PickleSerializer(), User, DB_PATH / 'user.snap'),
+        SnapshotDbDriver(JsonSerializer(), Project, DB_PATH / 'project.snap')
+    ])
+
+    loaded = user.key.load()
+    assert loaded.occupation == 'test'
+    assert loaded.projects[0].load().name == 'p0'
+
+    keys = [str(p.key) for p in projects]
+    loaded = Project.mload(keys + ['Project:missing', keys[3]])
+    assert [p.experiments for p in loaded[:25]] == list(range(25))
+    assert loaded[25] is None
+    assert loaded[26].name == 'p3'
+
+    assert Project.count() == 25
+    assert [str(k) for k in Project.get_all()] == sorted(keys)
+    assert Project.exists(keys[0])
+    assert not Project.exists('Project:missing')
+
+    scanned = []
+    cursor, batch = Project.scan_keys(batch_size=10)
+    scanned += batch
+    while cursor is not None:
+        cursor, batch = Project.scan_keys(cursor, batch_size=10)
+        scanned += batch
+    assert [str(k) for k in scanned] == sorted(keys)
+
+    return projects
+
+
+def test_read_only(projects):
+    project = projects[0].key.load()
+    project.experiments = 10
+    for write in (project.save, lambda: project.save(partial=True), project.delete,
+                  lambda: Project.msave([project])):
+        try:
+            write()
+        except RuntimeError:
+            pass
+        else:
+            assert False
+    assert projects[0].key.load().experiments == 0
+
+
+def test_reexport(drivers, projects):
+    _, project_driver = drivers
+    old = SnapshotDbDriver(JsonSerializer(), Project, DB_PATH / 'project.snap')
+    project_driver.save_dict(str(projects[0].key), {'name': 'changed'})
+    export_snapshot(project_driver, DB_PATH / 'project.snap')
+
+    # The old driver keeps reading the file it opened
+    assert old.load_dict(str(projects[0].key))['name'] == 'p0'
+    new = SnapshotDbDriver(JsonSerializer(), Project, DB_PATH / 'project.snap')
+    assert new.load_dict(str(projects[0].key))['name'] == 'changed'
+    assert new.count() == old.count()
+
+
+def test_empty():
+    export_snapshot(FileDbDriver(JsonSerializer(), Project, DB_PATH / 'empty'), DB_PATH / 'empty.snap')
+    empty = SnapshotDbDriver(JsonSerializer(), Project, DB_PATH / 'empty.snap')
+    assert empty.count() == 0
+    assert empty.get_all() == []
+    assert empty.load_dict('Project:missing') is None
+    assert empty.scan_keys(None, 10) == (None, [])
+
+    # Drivers without a serializer need one to export
+    try:
+        export_snapshot(DbDriver(None, Project), DB_PATH / 'none.snap')
+    except ValueError:
+        pass
+    else:
+        assert False
+    assert not (DB_PATH / 'none.snap').exists()
+    print('snapshot ok')
+
+
+if __name__ == '__main__':
+    _drivers = test_setup()
+    _projects = test_export(_drivers)
+    test_read_only(_projects)
+    test_reexport(_drivers, _projects)
+    test_empty()
@@ -0,0 +1,132 @@
+import shutil
+import threading
+from pathlib import Path
+
+from labml_db import Model, Index
+from labml_db.driver.sqlite import SqliteDbDriver, SqliteDatabase
+from labml_db.index_driver.sqlite import SqliteIndexDbDriver
+from labml_db.serializer.json import JsonSerializer
+from labml_db.serializer.pickle import PickleSerializer
+from test.simple import Project, User, UsernameIndex
+
+DB_PATH = Path('./data/sqlite')
+
+
+def test_setup():
+    db = SqliteDatabase(DB_PATH / 'db.sqlite')
+    Model.set_db_drivers([
+        SqliteDbDriver(PickleSerializer(), User, db),
+        SqliteDbDriver(JsonSerializer(), Project, db)
+    ])
+    Index.set_db_drivers([
+        SqliteIndexDbDriver(UsernameIndex, db)
+    ])
+    return db
+
+
+def test():
+    project = Project(name='nlp')
+    user = User(name='John', occupation='test')
+    user.projects.append(project.key)
+    user.save()
+    project.save()
+
+    loaded = user.key.load()
+    assert loaded.occupation == 'test'
+    assert loaded.projects[0].load().name == 'nlp'
+    assert User.exists(str(user.key))
+    assert not User.exists('User:missing')
+
+    loaded.occupation = None
+    loaded.save(partial=True)
+    loaded.append_to('projects', [project.key])
+    loaded = user.key.load()
+    assert loaded.occupation is None
+    assert len(loaded.projects) == 2
+
+    return user
+
+
+def test_mload():
+    # More keys than the number of parameters in one query
+    projects = [Project(name=f'p{i}', experiments=i) for i in range(2000)]
+    Project.msave(projects)
+    keys = [str(p.key) for p in projects]
+    keys = keys + keys[:10] + ['Project:missing']
+    loaded = Project.mload(keys)
+    assert [p.experiments for p in loaded[:2000]] == list(range(2000))
+    assert [p.experiments for p in loaded[2000:2010]] == list(range(10))
+    assert loaded[-1] is None
+    assert Project.count() == 2001
+
+    scanned = []
+    cursor, keys = Project.scan_keys(batch_size=300)
+    scanned += keys
+    while cursor is not None:
+        cursor, keys = Project.scan_keys(cursor, batch_size=300)
+        scanned += keys
+    assert [str(k) for k in scanned] == sorted(str(k) for k in Project.get_all())
+
+    Project.mdelete_by_key([str(p.key) for p in projects[1000:]])
+    assert Project.count() == 1001
+
+
+def test_index(user: User):
+    UsernameIndex.mset({})
+    UsernameIndex.mdelete([])
+    assert UsernameIndex.mget([]) == []
+
+    UsernameIndex.set(user.name, user.key)
+    names = {f'u{i}': User(name=f'u{i}').key for i in range(1000)}
+    UsernameIndex.mset(names)
+    assert UsernameIndex.get(user.name) == user.key
+    assert UsernameIndex.get('missing') is None
+    assert UsernameIndex.mget(['u1', 'missing', 'u1']) == [names['u1'], None, names['u1']]
+    assert len(UsernameIndex.get_all()) == 1001
+    assert UsernameIndex.get_all_key_values()[user.name] == user.key
+
+    UsernameIndex.mdelete(list(names))
+    UsernameIndex.delete(user.name)
+    assert UsernameIndex.get_all() == []
+
+
+def test_threads():
+    def _save(i: int):
+        Project.msave([Project(name=f't{i}:{j}') for j in range(50)])
+        for j in range(10):
+            Project(name=f't{i}:single{j}').save()
+
+    count = Project.count()
+    threads = [threading.Thread(target=_save, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert Project.count() == count + 8 * 60
+
+
+def test_reopen(db: SqliteDatabase, user: User):
+    count = Project.count()
+    db.close()
+    test_setup()
+    assert Project.count() == count
+    assert user.key.load().name == 'John'
+
+    try:
+        SqliteDatabase(DB_PATH / 'db.sqlite', synchronous='fast')
+    except ValueError:
+        pass
+    else:
+        assert False
+    SqliteDatabase(DB_PATH / 'db.sqlite', synchronous='full').close()
+    print('sqlite ok')
+
+
+if __name__ == '__main__':
+    shutil.rmtree(str(DB_PATH), ignore_errors=True)
+    _db = test_setup()
+    _user = test()
+    test_mload()
+    test_index(_user)
+    test_threads()
+    test_reopen(_db, _user)